@@ -0,0 +1,187 @@
+"""
+Measure server time and serialized payload of the landing page town chart for
+all towns over the full date range, comparing the original per-town loop over
+the raw transactions against the cube and single pass trace building.
+Aggregation and rendering are timed separately, since the app memoises the
+aggregated frame across reruns.
+
+The Distribution page box plots are compared for the last 12 months of every
+flat type, drawing raw points with px.box against precomputed statistics.
+
+The Remaining Lease scatter is compared for growing selections, drawing every
+transaction as SVG or WebGL markers against a server-side 2D histogram.
+
+    python -m benchmarks.charts
+"""
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import polars as pl
+from dateutil.relativedelta import relativedelta
+from plotly.subplots import make_subplots
+
+from benchmarks.timing import best_time
+from webapp.charts import (
+    MAX_OUTLIERS,
+    bin_2d,
+    box_stats,
+    build_box_figure,
+    build_density_figure,
+    build_town_figure,
+)
+from webapp.cube import aggregate_cube
+from webapp.read import load_cube, load_dataframe
+
+LEASE_BIN_SIZE = 1.0
+PRICE_BIN_SIZE = 20000
+
+
+def aggregate_raw(x: str) -> pl.DataFrame:
+    """The original aggregation over every transaction."""
+    return (
+        load_dataframe()
+        .group_by([x, "town"])
+        .agg(
+            pl.median("resale_price").alias("resale_price"),
+            pl.count("resale_price").alias("transaction_volume"),
+        )
+        .sort(["town", x])
+    )
+
+
+def aggregate_from_cube(x: str) -> pl.DataFrame:
+    return (
+        aggregate_cube(
+            load_cube().lazy().with_columns(pl.col("month").dt.year().alias("year")),
+            [x, "town"],
+        )
+        .rename({"quantile": "resale_price", "count": "transaction_volume"})
+        .collect()
+    )
+
+
+def per_town_loop(
+    chart_df: pl.DataFrame, x: str, show_transaction_volumes: bool
+) -> go.Figure:
+    """The original rendering: one filter pass and validated trace per town."""
+    fig = make_subplots(rows=1, cols=1, specs=[[{"secondary_y": True}]])
+    for town in chart_df["town"].unique().sort():
+        town_df = chart_df.filter(pl.col("town") == town)
+        fig.add_trace(
+            go.Scatter(
+                x=town_df[x],
+                y=town_df["resale_price"],
+                mode="lines",
+                name=town,
+                hovertemplate="$%{y}",
+                line=dict(shape="spline"),
+            ),
+            secondary_y=False,
+        )
+        if show_transaction_volumes:
+            fig.add_trace(
+                go.Bar(
+                    x=town_df[x],
+                    y=town_df["transaction_volume"],
+                    name=town,
+                    hovertemplate="%{y} transactions",
+                ),
+                secondary_y=True,
+            )
+    return fig
+
+
+def raw_box_figure(df: pl.DataFrame) -> go.Figure:
+    """The original Distribution page chart, computing quartiles in the browser."""
+    return px.box(df, x="town", y="resale_price", color="town")
+
+
+def stats_box_figure(df: pl.DataFrame) -> go.Figure:
+    stats = box_stats(df.lazy(), "town", "resale_price", MAX_OUTLIERS).collect()
+    colors = ["hsl({}, 70%, 70%)".format(h) for h in np.linspace(0, 360, stats.height)]
+    return build_box_figure(stats, "town", colors)
+
+
+def scatter_figure(df: pl.DataFrame, render_mode: str) -> go.Figure:
+    """The Remaining Lease scatter, with every transaction and its hover data."""
+    return px.scatter(
+        df,
+        x="remaining_lease_years_exact",
+        y="resale_price",
+        color="cat_remaining_lease_years",
+        hover_data=["address", "storey_range", "month"],
+        render_mode=render_mode,
+    )
+
+
+def density_figure(df: pl.DataFrame) -> go.Figure:
+    x, y = "remaining_lease_years_exact", "resale_price"
+    bins = bin_2d(df.lazy(), x, y, LEASE_BIN_SIZE, PRICE_BIN_SIZE).collect()
+    return build_density_figure(bins, x, y, LEASE_BIN_SIZE, PRICE_BIN_SIZE)
+
+
+def main():
+    # load the dataset and cube before timing
+    load_dataframe(), load_cube()
+
+    scenarios = {
+        "per-town loop": (aggregate_raw, "quarter_label", per_town_loop, {}),
+        "single pass": (aggregate_from_cube, "quarter_label", build_town_figure, {}),
+        "single pass, webgl": (
+            aggregate_from_cube,
+            "quarter_label",
+            build_town_figure,
+            {"webgl": True},
+        ),
+        "single pass, yearly": (aggregate_from_cube, "year", build_town_figure, {}),
+    }
+
+    for show_transaction_volumes in (False, True):
+        print(f"\nall towns, show transaction volumes: {show_transaction_volumes}")
+        print(f"{'':<22} {'aggregate':>10} {'render':>10} {'payload':>10}")
+        for name, (aggregate, x, render, options) in scenarios.items():
+            aggregate_seconds, chart_df = best_time(lambda: aggregate(x))
+            render_seconds, payload = best_time(
+                lambda: render(
+                    chart_df, x, show_transaction_volumes, **options
+                ).to_json()
+            )
+            print(
+                f"{name:<22} {aggregate_seconds * 1000:7.1f} ms "
+                f"{render_seconds * 1000:7.1f} ms {len(payload) / 1024:7.1f} KB"
+            )
+
+    df = load_dataframe()
+    df = df.filter(pl.col("month") > df["month"].max() - relativedelta(months=12))
+    print(f"\ndistribution of {df.height} transactions, all flat types")
+    print(f"{'':<22} {'render':>10} {'payload':>10}")
+    for name, render in (
+        ("raw points", raw_box_figure),
+        ("box stats", stats_box_figure),
+    ):
+        seconds, payload = best_time(lambda: render(df).to_json())
+        print(f"{name:<22} {seconds * 1000:7.1f} ms {len(payload) / 1024:7.1f} KB")
+
+    df = load_dataframe()
+    last_year = pl.col("month") > df["month"].max() - relativedelta(months=12)
+    selections = {
+        "4 ROOM, 12 months": df.filter(last_year, pl.col("flat_type") == "4 ROOM"),
+        "all flats, 12 months": df.filter(last_year),
+        "all flats, all months": df,
+    }
+    renderers = {
+        "svg points": lambda df: scatter_figure(df, "svg"),
+        "webgl points": lambda df: scatter_figure(df, "webgl"),
+        "density": density_figure,
+    }
+    for selection, df in selections.items():
+        print(f"\nremaining lease scatter, {selection}: {df.height} transactions")
+        print(f"{'':<22} {'render':>10} {'payload':>10}")
+        for name, render in renderers.items():
+            seconds, payload = best_time(lambda: render(df).to_json())
+            print(f"{name:<22} {seconds * 1000:7.1f} ms {len(payload) / 1024:7.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measure the throughput and failure behaviour of the extractor and geocoder
+against the local stand-ins of the APIs, for a set of injected faults.
+
+For every scenario the stand-ins are served from this process with the
+scenario's faults, and the extractor and geocoder run in a fresh interpreter
+pointed at them through the endpoint environment variables. Faults are seeded,
+so repeated runs make the same requests and run into the same faults.
+
+    python -m benchmarks.endpoints 2024-01 2024-03 --addresses 20
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+import polars as pl
+
+from webapp.update.mockserver import Faults, get_environment, start_server
+from webapp.utils import get_project_root
+
+# client timeouts are shortened so that timed out requests fail in seconds
+CLIENT_TIMEOUT = 2
+
+SCENARIOS = {
+    "baseline": Faults(),
+    "latency": Faults(latency=0.2),
+    "rate_limited": Faults(rate_limited=0.2),
+    "empty": Faults(empty=0.2),
+    "timeout": Faults(timeout=0.05, hang=CLIENT_TIMEOUT * 2),
+}
+
+
+def get_addresses(month: str, count: int) -> list[str]:
+    return (
+        pl.read_csv(get_project_root() / "data" / f"{month}.csv", infer_schema=False)[
+            "address"
+        ]
+        .unique(maintain_order=True)
+        .head(count)
+        .to_list()
+    )
+
+
+def run_scenario(start: str, end: str, addresses: int) -> dict:
+    from webapp.update import extract, geocode
+
+    extract.HDB_TIMEOUT = CLIENT_TIMEOUT
+    months = (
+        pl.date_range(pl.lit(f"{start}-01"), pl.lit(f"{end}-01"), "1mo", eager=True)
+        .dt.strftime("%Y-%m")
+        .to_list()
+    )
+
+    started_at = time.perf_counter()
+    with extract.create_session() as session:
+        heights = [extract.extract_hdb_data(month, session).height for month in months]
+    extract_time = time.perf_counter() - started_at
+
+    geocoder = geocode.Geocoder(geocode.RequestsTransport(timeout=CLIENT_TIMEOUT))
+    started_at = time.perf_counter()
+    results = asyncio.run(
+        geocode.geocode_addresses(get_addresses(months[0], addresses), geocoder)
+    )
+    geocode_time = time.perf_counter() - started_at
+
+    return {
+        "records": sum(heights),
+        "empty_months": heights.count(0),
+        "extract_time_s": round(extract_time, 3),
+        "records_per_s": round(sum(heights) / extract_time),
+        "addresses": len(results),
+        "unresolved": sum(result["source"] is None for result in results),
+        "osm_fallbacks": sum(result["source"] != "onemap" for result in results),
+        "geocode_time_s": round(geocode_time, 3),
+        "addresses_per_s": round(len(results) / geocode_time, 2),
+    }
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description="Benchmark the extract against stand-ins.")
+    parser.add_argument("start_date", help="Start date in YYYY-MM format")
+    parser.add_argument("end_date", help="End date in YYYY-MM format")
+    parser.add_argument("--addresses", type=int, default=20)
+    parser.add_argument("--scenario", choices=SCENARIOS)
+    parser.add_argument("--run", action="store_true", help=SUPPRESS)
+    args = parser.parse_args(raw_args)
+
+    if args.run:
+        result = run_scenario(args.start_date, args.end_date, args.addresses)
+        print(json.dumps(result))
+        return
+
+    for scenario in [args.scenario] if args.scenario else SCENARIOS:
+        server = start_server(SCENARIOS[scenario])
+        try:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.endpoints", args.start_date]
+                + [args.end_date, "--addresses", str(args.addresses), "--run"],
+                capture_output=True,
+                text=True,
+                check=True,
+                env={**os.environ, **get_environment(server)},
+            ).stdout
+        finally:
+            server.shutdown()
+        result = json.loads(output.strip().splitlines()[-1])
+        print(json.dumps({"scenario": scenario, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the extract pipeline offline for a range of months.
+
+The datastore API is replaced by a session that replays the committed CSV
+files, and geocoding is served from the geocode cache, so only the local
+merge/write work is measured. Each scenario runs in a fresh interpreter so
+that peak RSS is not shared between runs.
+
+    python -m benchmarks.extract 2023-01 2023-12
+"""
+
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from contextlib import chdir
+from pathlib import Path
+
+import polars as pl
+
+from webapp.utils import get_project_root
+
+SCENARIOS = {
+    "refresh": "re-process months whose CSV files already exist",
+    "backfill": "build months from scratch into an empty data directory",
+}
+
+
+class ReplayResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class ReplaySession:
+    """Stands in for the datastore API by serving records from the CSV files."""
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.records = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def get_records(self, month: str) -> list[dict]:
+        if month not in self.records:
+            self.records[month] = (
+                pl.read_csv(self.data_dir / f"{month}.csv", infer_schema=False)
+                .drop("address", "postal", "latitude", "longitude")
+                .with_columns(pl.col("_id").cast(pl.Int64))
+                .to_dicts()
+            )
+        return self.records[month]
+
+    def get(self, url, params, timeout=None):
+        month = json.loads(params["filters"])["month"]
+        records = self.get_records(month)
+        offset, limit = int(params["offset"]), int(params["limit"])
+        return ReplayResponse(
+            {"result": {"total": len(records), "records": records[offset:][:limit]}}
+        )
+
+
+def run_scenario(scenario: str, start: str, end: str) -> dict:
+    started_at = time.perf_counter()
+    from webapp.update import extract
+
+    import_time = time.perf_counter() - started_at
+
+    source_dir = get_project_root() / "data"
+    extract.create_session = lambda: ReplaySession(source_dir)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = Path(work_dir) / "data"
+        data_dir.mkdir()
+        if scenario == "refresh":
+            for path in source_dir.glob("*.csv"):
+                if start <= path.stem <= end:
+                    shutil.copy(path, data_dir)
+
+        with chdir(work_dir):
+            started_at = time.perf_counter()
+            extract.extract([start, end, "-f"])
+            wall_time = time.perf_counter() - started_at
+
+    return {
+        "scenario": scenario,
+        "import_time_s": round(import_time, 3),
+        "wall_time_s": round(wall_time, 3),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description="Benchmark the extract pipeline offline.")
+    parser.add_argument("start_date", help="Start date in YYYY-MM format")
+    parser.add_argument("end_date", help="End date in YYYY-MM format")
+    parser.add_argument("--scenario", choices=SCENARIOS)
+    args = parser.parse_args(raw_args)
+
+    if args.scenario:
+        result = run_scenario(args.scenario, args.start_date, args.end_date)
+        print(json.dumps(result))
+        return
+
+    for scenario in SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.extract", args.start_date]
+            + [args.end_date, "--scenario", scenario],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Profile the cold start of each page. Every page runs once through AppTest in a
+fresh interpreter started with -X importtime, after streamlit itself has been
+imported as it is in the server. The report gives the wall time of that first
+run, the time spent importing modules during it, and the packages that took
+the longest to import.
+
+    python -m benchmarks.imports
+"""
+
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+from webapp.utils import get_project_root
+
+TOP_PACKAGES = 5
+MARKER = "--- page run ---"
+
+CHILD = f"""
+import sys, time
+from streamlit.testing.v1 import AppTest
+
+print({MARKER!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+AppTest.from_file(sys.argv[1], default_timeout=300).run()
+print(time.perf_counter() - start)
+"""
+
+
+def get_pages() -> list[Path]:
+    webapp = get_project_root() / "webapp"
+    return [*webapp.glob("0_*.py"), *sorted((webapp / "pages").glob("*.py"))]
+
+
+def profile_page(page: Path) -> tuple[float, Counter]:
+    """Run `page` cold and return its wall time and import time per package."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, str(page)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=get_project_root(),
+    )
+    log = result.stderr.split(MARKER, 1)[1]
+
+    packages = Counter()
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, module = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            continue
+        packages[module.strip().split(".")[0]] += int(self_us) / 1000
+    return float(result.stdout.strip().splitlines()[-1]), packages
+
+
+def main():
+    for page in get_pages():
+        seconds, packages = profile_page(page)
+        print(
+            f"\n{page.name}: first run {seconds * 1000:.0f} ms, "
+            f"imports {sum(packages.values()):.0f} ms"
+        )
+        for package, ms in packages.most_common(TOP_PACKAGES):
+            print(f"  {package:<24} {ms:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure the server time and serialized size of the map layers handed to
+st_folium for growing numbers of pins, comparing a folium.Marker with its own
+popup per row against a single GeoJSON layer, rendered on every run or taken
+from the map cache.
+
+    python -m benchmarks.maps
+"""
+
+from collections.abc import Callable
+
+import folium
+import polars as pl
+from streamlit_folium import _get_feature_group_string
+
+from benchmarks.timing import best_time
+from webapp.geo import to_feature_collection
+from webapp.maps import cached_layer
+from webapp.read import load_dataframe
+
+FIELDS = ["address", "month", "storey_range", "resale_price"]
+
+
+def per_marker(points: pl.DataFrame) -> folium.FeatureGroup:
+    """The original rendering: one marker, popup and tooltip per row."""
+    layer = folium.FeatureGroup()
+    for row in points.iter_rows(named=True):
+        html = "<br>".join(f"<b>{name}:</b> {row[name]}" for name in FIELDS)
+        folium.Marker(
+            [row["latitude"], row["longitude"]],
+            popup=folium.Popup(html, max_width=170),
+            tooltip=html,
+            icon=folium.Icon(color="red", icon="home", prefix="fa"),
+        ).add_to(layer)
+    return layer
+
+
+def build_geojson(points: pl.DataFrame) -> folium.GeoJson:
+    return folium.GeoJson(
+        to_feature_collection(points, FIELDS),
+        marker=folium.Marker(icon=folium.Icon(color="red", icon="home", prefix="fa")),
+        tooltip=folium.GeoJsonTooltip(fields=FIELDS),
+        popup=folium.GeoJsonPopup(fields=FIELDS),
+    )
+
+
+def geojson(points: pl.DataFrame) -> folium.FeatureGroup:
+    layer = folium.FeatureGroup()
+    build_geojson(points).add_to(layer)
+    return layer
+
+
+def cached_geojson(points: pl.DataFrame) -> folium.FeatureGroup:
+    layer = folium.FeatureGroup()
+    cached_layer("benchmark", points, build_geojson).add_to(layer)
+    return layer
+
+
+def to_script(build: Callable, points: pl.DataFrame) -> str:
+    """Build the layer and render it the way st_folium does on every run."""
+    sg_map = folium.Map()
+    sg_map.render()
+    return _get_feature_group_string(build(points), sg_map)
+
+
+def main():
+    df = (
+        load_dataframe()
+        .drop_nulls(["latitude", "longitude"])
+        .with_columns(pl.col("month").cast(pl.Utf8))
+    )
+    for size in (25, 250, 1000):
+        points = df.head(size).select("latitude", "longitude", *FIELDS)
+        print(f"\n{size} pins")
+        print(f"{'':<22} {'render':>10} {'payload':>10}")
+        for name, build in (
+            ("marker per row", per_marker),
+            ("geojson", geojson),
+            ("geojson, cached", cached_geojson),
+        ):
+            seconds, payload = best_time(lambda: to_script(build, points))
+            print(f"{name:<22} {seconds * 1000:7.1f} ms {len(payload) / 1024:7.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
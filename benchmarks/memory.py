@@ -0,0 +1,39 @@
+"""
+Report the in-memory footprint of the resale table per column, comparing the
+compact representation loaded by the app against the same table with its
+dictionary encoded columns decoded back to plain strings.
+
+    python -m benchmarks.memory
+"""
+
+import polars as pl
+
+from webapp.read import get_dataframe_from_parquet
+
+
+def memory_report(df: pl.DataFrame) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "column": df.columns,
+            "dtype": [str(dtype).split("(")[0] for dtype in df.dtypes],
+            "mb": [df[column].estimated_size("mb") for column in df.columns],
+        }
+    )
+
+
+def main():
+    df = get_dataframe_from_parquet()
+    plain = memory_report(df.with_columns(pl.col(pl.Enum).cast(pl.Utf8)))
+    compact = memory_report(df)
+
+    report = plain.join(compact, on="column", suffix="_compact")
+
+    with pl.Config(tbl_rows=-1, float_precision=2):
+        print(report)
+
+    print(f"plain:   {plain['mb'].sum():.1f} MB")
+    print(f"compact: {compact['mb'].sum():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
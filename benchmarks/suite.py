@@ -0,0 +1,258 @@
+"""
+Benchmark the ETL, the dataset load, the sidebar filter and every page against
+synthetic datasets of 1x, 10x and 100x the committed resale transactions.
+
+Each scale is generated by resampling the rows of every monthly CSV file with
+new ids and jittered prices, into a copy of the project in a temporary
+directory. Every stage then runs in a fresh interpreter in that copy, so that
+peak RSS is not shared between stages, and the pages are run headlessly
+through AppTest.
+
+The results are appended to a JSON history and compared with the previous run
+at the same scale on the same machine. Timings are only comparable on one
+machine, so the history is kept out of git in benchmarks/history.json of each
+checkout; `--history` points at another file, such as one kept across CI runs.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --scales 1 10
+    python -m benchmarks.suite --history ~/hdb-kaki-history.json
+"""
+
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from benchmarks.imports import get_pages
+from webapp.schema import schema
+from webapp.utils import get_project_root
+
+SCALES = (1, 10, 100)
+COPIED = ("webapp", "benchmarks", "assets")
+HISTORY_PATH = get_project_root() / "benchmarks" / "history.json"
+TIMEOUT = 3600
+
+
+def generate_month(csv_path: Path, scale: int, first_id: int) -> pl.DataFrame:
+    """
+    Resample the transactions of a month `scale` times over, numbering them
+    from `first_id` and moving each price by up to 10% in steps of $1,000.
+    """
+    df = pl.read_csv(csv_path, schema=schema)
+    size = df.height * scale
+    jitter = (pl.int_range(pl.len()).hash(first_id) % 201).cast(pl.Int64) - 100
+    return df.sample(size, with_replacement=True, seed=first_id).with_columns(
+        pl.int_range(first_id, first_id + size, dtype=pl.Int64).alias("_id"),
+        ((pl.col("resale_price") * (1 + jitter / 1000) / 1000).round() * 1000).cast(
+            pl.Float32
+        ),
+    )
+
+
+def prepare_project(work_dir: Path, scale: int) -> int:
+    """Copy the app into `work_dir` with a dataset of `scale`, returning its rows."""
+    root = get_project_root()
+    for name in COPIED:
+        shutil.copytree(
+            root / name,
+            work_dir / name,
+            ignore=shutil.ignore_patterns("__pycache__", "history.json"),
+        )
+
+    data_dir = work_dir / "data"
+    data_dir.mkdir()
+    shutil.copy(root / "data" / "metadata", data_dir)
+
+    rows = 0
+    for csv_path in sorted((root / "data").glob("*.csv")):
+        df = generate_month(csv_path, scale, rows + 1)
+        df.write_csv(data_dir / csv_path.name)
+        rows += df.height
+    return rows
+
+
+def run_app(app) -> dict:
+    """Run a script twice, as on the first visit and on a rerun."""
+    started_at = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - started_at
+
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return {"wall_time_s": round(first_run, 3), "rerun_s": round(rerun, 3)}
+
+
+def filter_script():
+    from webapp.filter import SidebarFilter
+
+    # collects the selection, which is what the stage times
+    SidebarFilter(select_towns=(True, "multi")).df
+
+
+def run_stage(stage: str, page: str | None = None) -> dict:
+    """Run a single stage in the project copy in the working directory."""
+    if stage == "etl":
+        from webapp.update.convert import build_app_files, csv_to_parquet
+
+        started_at = time.perf_counter()
+        csv_to_parquet(full=True)
+        build_app_files()
+        result = {"wall_time_s": round(time.perf_counter() - started_at, 3)}
+
+    elif stage == "load":
+        from webapp.read import load_dataframe
+
+        started_at = time.perf_counter()
+        load_dataframe()
+        result = {"wall_time_s": round(time.perf_counter() - started_at, 3)}
+
+    else:
+        from streamlit.testing.v1 import AppTest
+
+        if stage == "filter":
+            app = AppTest.from_function(filter_script, default_timeout=TIMEOUT)
+        else:
+            app = AppTest.from_file(page, default_timeout=TIMEOUT)
+        result = run_app(app)
+
+    result["peak_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    return result
+
+
+def benchmark_stage(work_dir: Path, stage: str, page: Path | None = None) -> dict:
+    name = page.stem if page else stage
+    args = ["--stage", stage] + (["--page", str(page)] if page else [])
+    try:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", *args],
+            capture_output=True,
+            text=True,
+            cwd=work_dir,
+            timeout=TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return {"stage": name, "error": f"timed out after {TIMEOUT} s"}
+
+    if output.returncode < 0:
+        return {"stage": name, "error": f"killed by signal {-output.returncode}"}
+    if output.returncode:
+        return {"stage": name, "error": output.stderr.strip().splitlines()[-1]}
+    return {"stage": name, **json.loads(output.stdout.strip().splitlines()[-1])}
+
+
+def benchmark_scale(scale: int) -> dict:
+    root = get_project_root()
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        rows = prepare_project(work_dir, scale)
+        print(f"\n{scale}x: {rows:,} rows")
+
+        stages = []
+        for stage, page in [
+            ("etl", None),
+            ("load", None),
+            ("filter", None),
+            *(("page", page.relative_to(root)) for page in get_pages()),
+        ]:
+            stages.append(benchmark_stage(work_dir, stage, page))
+            print_stage(stages[-1])
+            # later stages read the dataset built by the ETL
+            if stage == "etl" and "error" in stages[-1]:
+                break
+
+    return {"scale": scale, "rows": rows, "stages": stages}
+
+
+def print_stage(result: dict, previous: dict | None = None):
+    if "error" in result:
+        print(f"  {result['stage']:<34} failed: {result['error']}")
+        return
+
+    line = f"  {result['stage']:<34} {result['wall_time_s'] * 1000:9.0f} ms"
+    if "rerun_s" in result:
+        line += f" {result['rerun_s'] * 1000:9.0f} ms rerun"
+    else:
+        line += " " * 16
+    line += f" {result['peak_rss_mb']:8.0f} MB"
+    if previous and "error" not in previous:
+        change = result["wall_time_s"] / max(previous["wall_time_s"], 1e-3) - 1
+        line += f" {change:+7.0%}"
+    print(line)
+
+
+def get_commit() -> str | None:
+    output = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+        cwd=get_project_root(),
+    )
+    return output.stdout.strip() or None
+
+
+def compare(history: list[dict], run: dict):
+    """Print each stage of `run` against the last run at its scale on this machine."""
+    previous = next(
+        (
+            entry
+            for entry in reversed(history)
+            if entry["scale"] == run["scale"] and entry.get("machine") == run["machine"]
+        ),
+        None,
+    )
+    if previous is None:
+        return
+
+    stages = {stage["stage"]: stage for stage in previous["stages"]}
+    print(
+        f"\n{run['scale']}x against {previous['commit']} ({previous['timestamp']})"
+        f" on {run['machine']}"
+    )
+    for stage in run["stages"]:
+        print_stage(stage, stages.get(stage["stage"]))
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description="Benchmark the app on synthetic datasets.")
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--stage", help="run a single stage in the current project")
+    parser.add_argument("--page", help="page run by the page stage")
+    args = parser.parse_args(raw_args)
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, args.page)))
+        return
+
+    history = json.loads(args.history.read_text()) if args.history.exists() else []
+    for scale in args.scales:
+        run = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": get_commit(),
+            "machine": platform.node(),
+            "python": platform.python_version(),
+            "polars": pl.__version__,
+            **benchmark_scale(scale),
+        }
+        compare(history, run)
+        history.append(run)
+        args.history.write_text(json.dumps(history, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""Timing helpers shared by the benchmarks."""
+
+import time
+from collections.abc import Callable
+
+REPEATS = 5
+
+
+def best_time(function: Callable, repeats: int = REPEATS) -> tuple[float, object]:
+    """Call `function` `repeats` times, returning the fastest time and a result."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
@@ -0,0 +1,22 @@
+import polars as pl
+import pytest
+
+from webapp.read import get_dataframe_from_parquet
+from webapp.utils import get_project_root
+
+
+@pytest.fixture(scope="session")
+def dataset() -> pl.DataFrame:
+    """The dataset assembled from the committed parquet partitions."""
+    return get_dataframe_from_parquet()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A data directory with the first rows of the CSV files of 2024-01 to 2024-03."""
+    for month in ("2024-01", "2024-02", "2024-03"):
+        source = get_project_root() / "data" / f"{month}.csv"
+        pl.read_csv(source, infer_schema=False).head(20).write_csv(
+            tmp_path / f"{month}.csv"
+        )
+    return tmp_path
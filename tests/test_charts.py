@@ -0,0 +1,16 @@
+import polars as pl
+
+from webapp.charts import box_stats
+
+
+def test_box_stats_of_empty_frame(dataset):
+    stats = box_stats(dataset.clear().lazy(), "town", "resale_price", 10).collect()
+    assert stats.is_empty()
+
+
+def test_box_stats_outliers_on_both_sides():
+    lf = pl.LazyFrame({"town": ["A"] * 7, "price": [1, 40, 50, 50, 50, 60, 200]})
+    stats = box_stats(lf, "town", "price", 10).collect().row(0, named=True)
+
+    assert (stats["lower_fence"], stats["upper_fence"]) == (40, 60)
+    assert stats["outliers"] == [1, 200]
@@ -0,0 +1,70 @@
+import polars as pl
+
+from webapp.update import convert
+from webapp.update.convert import convert_month, csv_to_parquet
+from webapp.update.manifest import load_manifest
+from webapp.utils import get_project_root
+
+MONTHS = ["2024-01", "2024-02", "2024-03"]
+
+
+def get_mtimes(data_dir) -> dict[str, int]:
+    return {
+        path.stem: path.stat().st_mtime_ns
+        for path in (data_dir / "parquet").glob("*.parquet")
+    }
+
+
+def test_convert_month_is_deterministic(tmp_path):
+    # ids repeat within this month, whose rows must keep their order
+    csv_path = get_project_root() / "data" / "2024-09.csv"
+    for attempt in range(3):
+        convert_month(csv_path, tmp_path / f"{attempt}.parquet")
+
+    contents = {path.read_bytes() for path in tmp_path.glob("*.parquet")}
+    assert len(contents) == 1
+
+
+def test_only_changed_months_are_converted(data_dir):
+    assert csv_to_parquet(data_dir=data_dir) == MONTHS
+    assert csv_to_parquet(data_dir=data_dir) == []
+    mtimes = get_mtimes(data_dir)
+
+    csv_path = data_dir / "2024-02.csv"
+    pl.read_csv(csv_path, infer_schema=False).head(10).write_csv(csv_path)
+    assert csv_to_parquet(data_dir=data_dir) == ["2024-02"]
+
+    changed = {
+        month for month, mtime in get_mtimes(data_dir).items() if mtime != mtimes[month]
+    }
+    assert changed == {"2024-02"}
+    partitions = load_manifest(data_dir / "manifest.json")["partitions"]
+    assert partitions["2024-02"]["rows"] == 10
+
+
+def test_months_restrict_the_check(data_dir):
+    csv_to_parquet(data_dir=data_dir)
+    for month in MONTHS:
+        csv_path = data_dir / f"{month}.csv"
+        pl.read_csv(csv_path, infer_schema=False).head(5).write_csv(csv_path)
+
+    assert csv_to_parquet(["2024-03"], data_dir=data_dir) == ["2024-03"]
+    assert csv_to_parquet(data_dir=data_dir) == ["2024-01", "2024-02"]
+
+
+def test_partitions_of_removed_months_are_deleted(data_dir):
+    csv_to_parquet(data_dir=data_dir)
+    (data_dir / "2024-01.csv").unlink()
+
+    assert csv_to_parquet(data_dir=data_dir) == ["2024-01"]
+    assert not (data_dir / "parquet" / "2024-01.parquet").exists()
+    partitions = load_manifest(data_dir / "manifest.json")["partitions"]
+    assert set(partitions) == {"2024-02", "2024-03"}
+
+
+def test_version_bump_rebuilds_every_partition(data_dir, monkeypatch):
+    csv_to_parquet(data_dir=data_dir)
+    monkeypatch.setattr(convert, "PARTITION_VERSION", convert.PARTITION_VERSION + 1)
+
+    assert csv_to_parquet(["2024-01"], data_dir=data_dir) == MONTHS
+    assert csv_to_parquet(data_dir=data_dir) == []
@@ -0,0 +1,45 @@
+import polars as pl
+import pytest
+
+from webapp.cube import SKETCH_ACCURACY, aggregate_cube, build_cube
+
+
+@pytest.fixture(scope="module")
+def cube(dataset: pl.DataFrame) -> pl.DataFrame:
+    return build_cube(dataset)
+
+
+def exact(dataset: pl.DataFrame, by: list[str], quantile: float) -> pl.DataFrame:
+    return dataset.group_by(by).agg(
+        pl.len().alias("expected_count"),
+        pl.quantile("resale_price", quantile, interpolation="linear").alias("expected"),
+    )
+
+
+@pytest.mark.parametrize(
+    "by",
+    [
+        ["quarter_label", "cat_remaining_lease_years"],
+        ["quarter_label", "town"],
+        ["town"],
+        ["flat_type"],
+    ],
+)
+@pytest.mark.parametrize("quantile", [0.25, 0.5, 0.9])
+def test_merged_quantiles_within_sketch_accuracy(dataset, cube, by, quantile):
+    merged = aggregate_cube(cube.lazy(), by, quantile).collect()
+    result = merged.join(exact(dataset, by, quantile), on=by, join_nulls=True)
+
+    assert result.height == merged.height
+    assert (result["count"] == result["expected_count"]).all()
+
+    error = ((result["quantile"] - result["expected"]).abs() / result["expected"]).max()
+    assert error <= SKETCH_ACCURACY + 1e-9
+
+
+def test_single_cells_use_exact_median(dataset, cube):
+    by = ["month", "quarter_label", "town", "flat_type", "cat_remaining_lease_years"]
+    merged = aggregate_cube(cube.lazy(), by).collect()
+    result = merged.join(exact(dataset, by, 0.5), on=by, join_nulls=True)
+
+    assert (result["quantile"] == result["expected"]).all()
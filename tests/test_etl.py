@@ -0,0 +1,65 @@
+from functools import partial
+
+import polars as pl
+import pytest
+
+from webapp.update import convert, etl
+from webapp.update.convert import csv_to_parquet
+
+
+def run_etl(data_dir, tmp_path, monkeypatch) -> dict[str, str]:
+    """Run update_data over `data_dir` without extracting, returning its outputs."""
+    github_env = tmp_path / "github_env"
+    github_env.unlink(missing_ok=True)
+    monkeypatch.setenv("GITHUB_ENV", str(github_env))
+    monkeypatch.setattr(etl, "extract", lambda args: None)
+    monkeypatch.setattr(
+        etl, "csv_to_parquet", partial(csv_to_parquet, data_dir=data_dir)
+    )
+
+    with pytest.raises(SystemExit):
+        etl.update_data()
+    return dict(line.split("=", 1) for line in github_env.read_text().splitlines())
+
+
+def test_changed_months_are_reported(data_dir, tmp_path, monkeypatch):
+    outputs = run_etl(data_dir, tmp_path, monkeypatch)
+    assert outputs == {
+        "has_changes": "true",
+        "changed_months": "2024-01 2024-02 2024-03",
+    }
+
+    assert run_etl(data_dir, tmp_path, monkeypatch) == {
+        "has_changes": "false",
+        "changed_months": "",
+    }
+
+    (data_dir / "2024-03.csv").unlink()
+    outputs = run_etl(data_dir, tmp_path, monkeypatch)
+    assert outputs["changed_months"] == "2024-03"
+
+
+def test_version_bump_is_reported(data_dir, tmp_path, monkeypatch):
+    run_etl(data_dir, tmp_path, monkeypatch)
+    monkeypatch.setattr(convert, "PARTITION_VERSION", convert.PARTITION_VERSION + 1)
+
+    outputs = run_etl(data_dir, tmp_path, monkeypatch)
+    assert outputs["has_changes"] == "true"
+    assert outputs["changed_months"] == "2024-01 2024-02 2024-03"
+
+
+def test_months_of_a_failed_run_are_reported_again(data_dir, tmp_path, monkeypatch):
+    run_etl(data_dir, tmp_path, monkeypatch)
+    changed = data_dir / "2024-01.csv"
+    changed.write_text("\n".join(changed.read_text().splitlines()[:-1]) + "\n")
+    broken = data_dir / "2024-02.csv"
+    original = broken.read_text()
+    broken.write_text(original.replace("2024-02", "2024-2", 1))
+
+    # 2024-01 is converted before 2024-02 fails, but the manifest is not saved
+    with pytest.raises(pl.exceptions.InvalidOperationError):
+        run_etl(data_dir, tmp_path, monkeypatch)
+
+    broken.write_text(original)
+    outputs = run_etl(data_dir, tmp_path, monkeypatch)
+    assert outputs["changed_months"] == "2024-01"
@@ -0,0 +1,107 @@
+import polars as pl
+import pytest
+
+from webapp.update import extract
+from webapp.update.extract import create_session, extract_hdb_data, map_schema
+from webapp.update.manifest import load_manifest
+from webapp.update.mockserver import Faults, get_environment, start_server
+from webapp.utils import get_project_root
+
+MONTHS = ["2024-01", "2024-02"]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Serve the first rows of a few recorded months, in pages of five records."""
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    for month in MONTHS:
+        source = get_project_root() / "data" / f"{month}.csv"
+        pl.read_csv(source, infer_schema=False).head(12).write_csv(
+            source_dir / f"{month}.csv"
+        )
+
+    server = start_server(Faults(), data_dir=source_dir)
+    monkeypatch.setattr(extract, "HDB_URL", get_environment(server)["HDB_URL"])
+    monkeypatch.setattr(extract, "PAGE_SIZE", 5)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Run the extract from an empty directory, without geocoding."""
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+    monkeypatch.setattr(
+        extract,
+        "get_map_results",
+        lambda addresses: pl.DataFrame(
+            {"address": addresses.unique(maintain_order=True)}
+        ).with_columns(
+            pl.lit(None, dtype).alias(column)
+            for column, dtype in map_schema.items()
+            if column != "address"
+        ),
+    )
+    return work_dir
+
+
+def count_requests(server) -> int:
+    return sum(server.service.attempts.values())
+
+
+def test_every_page_is_fetched(server):
+    with create_session() as session:
+        df = extract_hdb_data("2024-01", session)
+
+    assert df.height == 12
+    assert df["_id"].n_unique() == 12
+    assert count_requests(server) == 3
+
+
+def interrupt_month(monkeypatch, month: str):
+    """Make the extract fail while processing `month`."""
+    process_month = extract.process_month
+
+    def interrupted(current, *args):
+        if current == month:
+            raise KeyboardInterrupt
+        return process_month(current, *args)
+
+    monkeypatch.setattr(extract, "process_month", interrupted)
+
+
+def test_resume_reuses_the_checkpoints(server, work_dir, monkeypatch):
+    checkpoint_dir = work_dir / "data" / ".checkpoints"
+    with monkeypatch.context() as patch:
+        interrupt_month(patch, "2024-02")
+        with pytest.raises(KeyboardInterrupt):
+            extract.extract([*MONTHS, "-f"])
+
+    assert load_manifest(checkpoint_dir / "progress.json") == {"2024-01": "done"}
+    assert (work_dir / "data" / "2024-01.csv").exists()
+    assert not (checkpoint_dir / "2024-01.parquet").exists()
+    assert (checkpoint_dir / "2024-02.parquet").exists()
+
+    requests = count_requests(server)
+    extract.extract([*MONTHS, "-f", "--resume"])
+
+    assert count_requests(server) == requests
+    assert pl.read_csv(work_dir / "data" / "2024-02.csv").height == 12
+    assert not checkpoint_dir.exists()
+
+
+def test_fresh_run_discards_the_checkpoints(server, work_dir, monkeypatch):
+    with monkeypatch.context() as patch:
+        interrupt_month(patch, "2024-02")
+        with pytest.raises(KeyboardInterrupt):
+            extract.extract([*MONTHS, "-f"])
+
+    requests = count_requests(server)
+    extract.extract([*MONTHS, "-f"])
+
+    # both months are fetched again, three pages each
+    assert count_requests(server) == requests + 6
+    assert not (work_dir / "data" / ".checkpoints").exists()
@@ -0,0 +1,67 @@
+import json
+
+from streamlit.testing.v1 import AppTest
+
+from webapp.perf import PERF_ENV, PERF_LOG_ENV
+
+HIGHEST_PRICE_PAGE = "webapp/pages/4💲_Highest_Resale_Price.py"
+
+
+def filter_script(default_lease_years):
+    import streamlit as st
+
+    from webapp.filter import SidebarFilter
+
+    sf = SidebarFilter(
+        select_towns=(True, "multi"), default_lease_years=default_lease_years
+    )
+    st.session_state["lease"] = (sf.lease_domain, sf.lease_range)
+
+
+def run_filter(default_lease_years) -> AppTest:
+    return AppTest.from_function(
+        filter_script, default_timeout=60, args=(default_lease_years,)
+    ).run()
+
+
+def test_default_lease_range_is_applied():
+    app = run_filter((81, 99))
+    assert not app.exception
+    assert app.session_state["lease"][1] == (81, 99)
+
+
+def test_full_lease_range_is_left_out_of_the_key():
+    app = run_filter(None)
+    assert app.session_state["lease"][1] is None
+
+
+def test_widened_lease_range_is_left_out_of_the_key():
+    app = run_filter((81, 99))
+    (min_year, max_year), _ = app.session_state["lease"]
+    assert max_year < 99
+
+    # the default widens the slider past the domain, to which it is dragged
+    app.sidebar.slider[-1].set_value((min_year, 99)).run()
+    assert app.session_state["lease"][1] is None
+
+
+def get_queries(log_path) -> list[str]:
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    return [record["query"] for record in records if "query" in record]
+
+
+def test_highest_price_page_defaults_to_partials(tmp_path, monkeypatch):
+    log_path = tmp_path / "perf.jsonl"
+    monkeypatch.setenv(PERF_ENV, "1")
+    monkeypatch.setenv(PERF_LOG_ENV, str(log_path))
+
+    app = AppTest.from_file(HIGHEST_PRICE_PAGE, default_timeout=60).run()
+    assert not app.exception
+    assert app.sidebar.slider[-1].value == (81, 99)
+    assert get_queries(log_path) == ["top_1_town_partials"]
+
+    # a range cutting through a lease category ranks the rows instead
+    log_path.unlink()
+    app.sidebar.slider[-1].set_value((85, 99)).run()
+    assert not app.exception
+    assert get_queries(log_path) == ["top_1_town_rows"]
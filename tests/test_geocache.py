@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import polars as pl
+
+from webapp.update.geocache import GeocodeCache, prewarm
+
+
+def write_month(data_dir, month: str, rows: list[tuple]):
+    pl.DataFrame(
+        rows, schema=["address", "postal", "latitude", "longitude"], orient="row"
+    ).with_columns(pl.lit(month).alias("month")).write_csv(data_dir / f"{month}.csv")
+
+
+def test_prewarm_dates_entries_to_their_latest_month(tmp_path):
+    write_month(tmp_path, "2023-01", [("1 A ST", "100001", 1.30, 103.80)])
+    write_month(
+        tmp_path,
+        "2024-06",
+        [("1 A ST", "100001", 1.31, 103.81), ("2 B ST", None, None, None)],
+    )
+
+    with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+        assert prewarm(cache, tmp_path) == 1
+        (fetched_at,) = cache.connection.execute(
+            "SELECT fetched_at FROM geocode WHERE address = '1 A ST'"
+        ).fetchone()
+        location = cache.get_many(["1 A ST"], include_expired=True)["1 A ST"]
+
+    june = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    assert fetched_at == int(june.timestamp())
+    assert location["latitude"] == 1.31
+
+
+def test_prewarm_keeps_cached_entries(tmp_path):
+    write_month(tmp_path, "2024-06", [("1 A ST", "100001", 1.31, 103.81)])
+
+    with GeocodeCache(tmp_path / "geocode.sqlite") as cache:
+        cache.put_many(
+            [
+                {
+                    "address": "1 A ST",
+                    "postal": "100001",
+                    "latitude": 1.5,
+                    "longitude": 104.0,
+                    "source": "onemap",
+                }
+            ]
+        )
+        assert prewarm(cache, tmp_path) == 0
+        assert cache.get_many(["1 A ST"])["1 A ST"]["latitude"] == 1.5
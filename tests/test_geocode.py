@@ -0,0 +1,149 @@
+import asyncio
+
+import polars as pl
+import pytest
+
+from webapp.schema import schema
+from webapp.update import geocode
+from webapp.update.geocode import (
+    CircuitBreaker,
+    Geocoder,
+    HostPolicy,
+    RequestsTransport,
+    TransientError,
+    geocode_addresses,
+)
+from webapp.update.mockserver import Faults, get_environment, start_server
+from webapp.utils import get_project_root
+
+
+@pytest.fixture(scope="module")
+def recorded() -> dict:
+    """A located address from the committed CSV files, as a geocoding result."""
+    row = (
+        pl.read_csv(get_project_root() / "data" / "2024-01.csv", schema=schema)
+        .drop_nulls(["postal", "latitude", "longitude"])
+        .row(0, named=True)
+    )
+    return {column: row[column] for column in ("address", "postal", "latitude")}
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Point the geocoder at stand-ins injecting the given faults."""
+    servers = []
+
+    def serve(faults: Faults):
+        server = start_server(faults)
+        servers.append(server)
+        environment = get_environment(server)
+        monkeypatch.setattr(geocode, "ONEMAP_URL", environment["ONEMAP_URL"])
+        monkeypatch.setattr(geocode, "NOMINATIM_URL", environment["NOMINATIM_URL"])
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+def create_geocoder(timeout: float = 5, max_retries: int = 5) -> Geocoder:
+    # rate limits are lifted so that the tests only wait on injected faults
+    return Geocoder(
+        RequestsTransport(timeout=timeout),
+        onemap=HostPolicy(concurrency=8, rate=1000, burst=1000),
+        nominatim=HostPolicy(concurrency=8, rate=1000, burst=1000),
+        max_retries=max_retries,
+        backoff=0.01,
+    )
+
+
+def geocode_one(geocoder: Geocoder, address: str) -> dict:
+    return asyncio.run(geocode_addresses([address], geocoder))[0]
+
+
+def test_recorded_address_resolves_from_onemap(serve, recorded):
+    serve(Faults())
+    result = geocode_one(create_geocoder(), recorded["address"])
+
+    assert result["source"] == "onemap"
+    assert int(result["postal"]) == recorded["postal"]
+    assert float(result["latitude"]) == pytest.approx(recorded["latitude"])
+
+
+def test_rate_limited_requests_are_retried(serve, recorded):
+    serve(Faults(rate_limited=0.5, seed=1))
+    results = asyncio.run(
+        geocode_addresses([recorded["address"]] * 20, create_geocoder())
+    )
+
+    assert all(result["source"] == "onemap" for result in results)
+
+
+def test_empty_onemap_results_fall_back_to_nominatim(serve, recorded):
+    # the first request of this seed is answered without results, the next not
+    serve(Faults(empty=0.5, seed=3))
+    result = geocode_one(create_geocoder(), recorded["address"])
+
+    assert result["source"] == "osm"
+    assert int(result["postal"]) == recorded["postal"]
+
+
+def test_unresolved_address_when_every_request_times_out(serve, recorded):
+    serve(Faults(timeout=1, hang=1))
+    result = geocode_one(
+        create_geocoder(timeout=0.1, max_retries=1), recorded["address"]
+    )
+
+    assert result == {
+        "address": recorded["address"],
+        "postal": None,
+        "latitude": None,
+        "longitude": None,
+        "source": None,
+    }
+
+
+def test_transient_errors_are_retried_through_any_transport():
+    class FlakyTransport:
+        def __init__(self):
+            self.calls = 0
+
+        async def get_json(self, url: str, params: dict):
+            self.calls += 1
+            if self.calls < 3:
+                raise TransientError("unavailable")
+            return {
+                "results": [
+                    {"POSTAL": "560406", "LATITUDE": "1.36", "LONGITUDE": "103.85"}
+                ]
+            }
+
+    transport = FlakyTransport()
+    geocoder = Geocoder(transport, max_retries=5, backoff=0.01)
+    result = geocode_one(geocoder, "406 ANG MO KIO AVE 10")
+
+    assert transport.calls == 3
+    assert result["source"] == "onemap"
+    assert result["postal"] == "560406"
+
+
+def test_open_breaker_lets_a_single_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    # the trial is claimed by the first request, the others wait on its outcome
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_open_breaker_waits_for_the_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    assert not breaker.allow_request()
@@ -0,0 +1,58 @@
+import polars as pl
+import pytest
+
+from webapp.lease import (
+    DEFAULT_LEASE_EDGES,
+    bucket_lease,
+    get_lease_labels,
+    parse_lease_edges,
+    remaining_lease_years,
+)
+
+
+def test_edges_are_parsed():
+    assert parse_lease_edges("60, 80, 99") == DEFAULT_LEASE_EDGES
+    assert parse_lease_edges("50,70,90,99,") == (50, 70, 90, 99)
+
+
+@pytest.mark.parametrize("text", ["", "80, 60", "60, 60, 99", "0, 99", "sixty"])
+def test_invalid_edges_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_lease_edges(text)
+
+
+def test_last_bucket_extends_to_the_longest_lease():
+    assert parse_lease_edges("60, 80") == (60, 80, 99)
+    assert get_lease_labels((60, 80, 99)) == [
+        "0-60 years",
+        "61-80 years",
+        "81-99 years",
+    ]
+
+
+def test_remaining_lease_is_parsed_into_years():
+    df = pl.DataFrame({"remaining_lease": ["61 years 06 months", "95 years"]})
+    assert df.select(remaining_lease_years())["remaining_lease"].to_list() == [
+        61.5,
+        95.0,
+    ]
+
+
+def test_every_lease_is_bucketed(dataset):
+    edges = parse_lease_edges("60, 80")
+    buckets = dataset.select(bucket_lease(edges=edges).alias("bucket"))["bucket"]
+
+    assert buckets.null_count() == 0
+    assert set(buckets.unique()) == set(get_lease_labels(edges))
+
+
+def test_buckets_include_their_upper_edge():
+    df = pl.DataFrame({"remaining_lease_years": [1, 60, 61, 80, 81, 99]})
+    assert df.select(bucket_lease().alias("bucket"))["bucket"].to_list() == [
+        "0-60 years",
+        "0-60 years",
+        "61-80 years",
+        "61-80 years",
+        "81-99 years",
+        "81-99 years",
+    ]
@@ -0,0 +1,59 @@
+import folium
+import polars as pl
+from streamlit_folium import _get_feature_group_string
+
+from webapp.geo import to_feature_collection
+from webapp.maps import RenderedLayer, format_price, render_layer
+
+
+def test_format_price_groups_thousands():
+    prices = pl.Series([0.0, 999.0, 1000.0, 123456.0, 1234567.6, None])
+    assert pl.select(format_price(pl.lit(prices))).to_series().to_list() == [
+        "$0",
+        "$999",
+        "$1,000",
+        "$123,456",
+        "$1,234,568",
+        None,
+    ]
+
+
+def build_layer() -> folium.GeoJson:
+    points = pl.DataFrame(
+        {
+            "latitude": [1.35, 1.36],
+            "longitude": [103.82, 103.83],
+            "price": ["$500,000", "$1,200,000"],
+        }
+    )
+    return folium.GeoJson(
+        to_feature_collection(points, ["price"]),
+        marker=folium.CircleMarker(fill=True),
+        tooltip=folium.GeoJsonTooltip(fields=["price"]),
+    )
+
+
+def script_lines(script: str) -> list[str]:
+    return [line.strip() for line in script.splitlines() if line.strip()]
+
+
+def test_rendered_layer_matches_folium_render():
+    layer = build_layer()
+    script, layer_name = render_layer(layer)
+
+    # render_layer adds the layer to a map, whose page folium renders in full
+    html = layer.get_root().render()
+    assert layer_name in script
+    for line in script_lines(script):
+        assert line in html
+
+
+def test_rendered_layer_is_sent_by_st_folium():
+    script, layer_name = render_layer(build_layer())
+    group = folium.FeatureGroup()
+    RenderedLayer(script, layer_name).add_to(group)
+
+    sent = _get_feature_group_string(group, folium.Map())
+    assert f"{layer_name}.addTo(feature_group_feature_group_0);" in sent
+    for line in script_lines(script):
+        assert line in sent
@@ -0,0 +1,76 @@
+import json
+
+import plotly.graph_objects as go
+import pytest
+
+from webapp.perf import (
+    NULL_SPAN,
+    PERF_ENV,
+    PERF_LOG_ENV,
+    begin_trace,
+    plotly_chart,
+    show_perf_panel,
+    span,
+    trace_fragment,
+)
+
+
+@trace_fragment
+def fragment():
+    with span("inner"):
+        pass
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = tmp_path / "perf.jsonl"
+    monkeypatch.setenv(PERF_ENV, "1")
+    monkeypatch.setenv(PERF_LOG_ENV, str(path))
+    path.touch()
+    return path
+
+
+def read_spans(log_path) -> list[tuple[str, str, int]]:
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    return [(record["page"], record["span"], record["depth"]) for record in records]
+
+
+def test_panel_ends_the_trace(log_path):
+    begin_trace("Page")
+    show_perf_panel()
+    assert span("after") is NULL_SPAN
+
+
+def test_fragment_in_page_rerun_joins_its_trace(log_path):
+    begin_trace("Page")
+    fragment()
+    show_perf_panel()
+    assert read_spans(log_path) == [("Page", "inner", 0)]
+
+
+def test_fragment_rerun_is_traced_on_its_own(log_path):
+    begin_trace("Page")
+    show_perf_panel()
+    fragment()
+
+    name = f"{fragment.__module__}.fragment"
+    assert read_spans(log_path) == [(name, "inner", 1), (name, name, 0)]
+    assert span("after") is NULL_SPAN
+
+
+def test_chart_records_the_bytes_of_its_figure(log_path):
+    figure = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+    begin_trace("Page")
+    plotly_chart(figure, chart="bar")
+    show_perf_panel()
+
+    (record,) = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert record["span"] == "st.plotly_chart"
+    assert record["chart"] == "bar"
+    assert record["bytes"] == len(figure.to_json())
+
+
+def test_untraced_chart_is_not_serialised(monkeypatch):
+    figure = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+    monkeypatch.setattr(figure, "to_json", pytest.fail)
+    plotly_chart(figure)
@@ -0,0 +1,66 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from webapp.query import (
+    TOP_PARTIAL_N,
+    build_top_partials,
+    latest_per_key,
+    partials_answer_lease_range,
+    top_n_per_group,
+)
+
+
+@pytest.fixture(scope="module")
+def partials(dataset: pl.DataFrame) -> pl.DataFrame:
+    return build_top_partials(dataset)
+
+
+@pytest.mark.parametrize("by", [["town"], ["flat_type"], ["town", "flat_type"]])
+@pytest.mark.parametrize("n", [1, 3, TOP_PARTIAL_N])
+@pytest.mark.parametrize(
+    "predicate",
+    [
+        pl.lit(True),
+        pl.col("month").is_between(date(2023, 1, 1), date(2023, 12, 1)),
+        pl.col("town").is_in(["ANG MO KIO", "BEDOK"])
+        & (pl.col("flat_type") == "4 ROOM"),
+        pl.col("remaining_lease_years").is_between(81, 99),
+        pl.col("remaining_lease_years").is_between(1, 80)
+        & pl.col("month").is_between(date(2023, 1, 1), date(2023, 12, 1)),
+    ],
+)
+def test_top_partials_equal_raw_ranking(dataset, partials, by, n, predicate):
+    def top(df: pl.DataFrame) -> pl.DataFrame:
+        return top_n_per_group(df.lazy().filter(predicate), by, n).collect()
+
+    assert top(partials).equals(top(dataset))
+
+
+@pytest.mark.parametrize(
+    "lease_range, expected",
+    [
+        (None, True),
+        ((81, 99), True),
+        ((1, 80), True),
+        ((61, 80), True),
+        ((81, 95), False),
+        ((70, 99), False),
+    ],
+)
+def test_partials_answer_whole_lease_categories(lease_range, expected):
+    assert partials_answer_lease_range(lease_range) == expected
+
+
+def test_latest_per_key_keeps_last_transaction(dataset):
+    latest = latest_per_key(dataset.lazy(), "address").collect()
+    expected = (
+        dataset.sort("month", "_id")
+        .group_by("address")
+        .agg(pl.col("_id").last())
+        .sort("address")
+    )
+
+    assert latest.height == expected.height
+    assert latest.select("address", "_id").sort("address").equals(expected)
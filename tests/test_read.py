@@ -0,0 +1,13 @@
+import io
+
+import polars as pl
+
+from webapp.read import download_columns, serialize_dataframe
+
+
+def test_downloads_hold_public_columns(dataset):
+    df = dataset.head(100).with_columns(pl.lit("High").alias("cat_resale_price"))
+    downloaded = pl.read_parquet(io.BytesIO(serialize_dataframe(df, "Parquet")))
+
+    assert downloaded.columns == download_columns
+    assert downloaded.height == df.height
@@ -1,16 +1,21 @@
 from datetime import datetime
 
-import plotly.express as px
-import plotly.graph_objects as go
 import polars as pl
 import streamlit as st
-from plotly.subplots import make_subplots
 
+from webapp.charts import build_line_figure, build_town_figure
+from webapp.cube import aggregate_cube
+from webapp.download import download_data
 from webapp.filter import SidebarFilter
 from webapp.logo import icon, logo
-from webapp.read import get_last_updated_badge, load_dataframe
+from webapp.perf import begin_trace, plotly_chart, show_perf_panel
+from webapp.read import get_last_updated_badge, load_cube
+
+# towns above which the town chart can be downsampled to yearly medians
+DOWNSAMPLE_TOWNS = 10
 
 st.set_page_config(page_title="HDB Kaki", page_icon=icon, layout="wide")
+begin_trace("HDB Kaki")
 
 st.image(logo, width=500)
 
@@ -47,9 +52,10 @@ annotations = dict(
 
 def plot_lease_years(sf: SidebarFilter):
     """Plot percentage change in median resale price by lease years."""
-    chart_df = (
-        sf.df.group_by(["quarter_label", "cat_remaining_lease_years"])
-        .agg(pl.median("resale_price").alias("median_resale_price"))
+    chart_df = sf.collect(
+        "cube_lease_years",
+        lambda lf: aggregate_cube(lf, ["quarter_label", "cat_remaining_lease_years"])
+        .rename({"quantile": "median_resale_price"})
         .sort(["cat_remaining_lease_years", "quarter_label"])
         .with_columns(
             (
@@ -61,27 +67,25 @@ def plot_lease_years(sf: SidebarFilter):
                 * 100
             ).alias("percentage_change")
         )
-        .sort(by="quarter_label")
+        .sort(by="quarter_label"),
+        source=load_cube(),
     )
 
-    fig = px.line(
-        chart_df,
-        x="quarter_label",
-        y="percentage_change",
-        color="cat_remaining_lease_years",
+    fig = build_line_figure(
+        chart_df, "quarter_label", "percentage_change", "cat_remaining_lease_years"
+    )
+    fig.update_layout(
         title=f"Percentage Change in Median Resale Price since {str(sf.start_date)[:7]}",
-        labels={
-            "percentage_change": "Percentage Change (%)",
-            "quarter_label": "Quarter",
-            "cat_remaining_lease_years": "Remaining Lease Years",
-        },
+        xaxis_title="Quarter",
+        yaxis_title="Percentage Change (%)",
+        legend_title="Remaining Lease Years",
     )
 
     fig.update_yaxes(ticksuffix="%")
     fig.update_traces(hovertemplate="%{y:.2f}%")
     fig.update_layout(hovermode="x unified", **annotations)
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
 
 
 def plot_town(sf: SidebarFilter):
@@ -89,73 +93,39 @@ def plot_town(sf: SidebarFilter):
     show_transaction_volumes = st.sidebar.checkbox(
         "Show transaction volumes", value=False
     )
-
-    chart_df = (
-        sf.df.group_by(["quarter_label", "town"])
-        .agg(
-            pl.median("resale_price").alias("resale_price"),
-            pl.count("resale_price").alias("transaction_volume"),
-        )
-        .sort(["town", "quarter_label"])
+    webgl = st.sidebar.checkbox(
+        "Render with WebGL",
+        value=False,
+        help="Faster with many towns, but draws straight lines",
+    )
+    downsample = st.sidebar.checkbox(
+        f"Yearly medians above {DOWNSAMPLE_TOWNS} towns",
+        value=False,
+        help="Plot one point per year instead of per quarter when many towns are shown",
     )
 
-    fig = make_subplots(rows=1, cols=1, specs=[[{"secondary_y": True}]])
-
-    for town in chart_df["town"].unique().sort():
-        town_df = chart_df.filter(pl.col("town") == town)
-
-        fig.add_trace(
-            go.Scatter(
-                x=town_df["quarter_label"],
-                y=town_df["resale_price"],
-                mode="lines",
-                name=town,
-                hovertemplate="$%{y}",
-                line=dict(shape="spline"),
-            ),
-            secondary_y=False,
-        )
+    x = "quarter_label"
+    if downsample and sf.metadata["town"].n_unique() > DOWNSAMPLE_TOWNS:
+        x = "year"
 
-        if show_transaction_volumes:
-            fig.add_trace(
-                go.Bar(
-                    x=town_df["quarter_label"],
-                    y=town_df["transaction_volume"],
-                    name=town,
-                    hovertemplate="%{y} transactions",
-                ),
-                secondary_y=True,
-            )
-
-    fig.update_xaxes(tickformat="%Y-%m")
-    fig.update_yaxes(
-        showgrid=False, zeroline=False, secondary_y=True, showticklabels=False
+    chart_df = sf.collect(
+        f"cube_town_{x}",
+        lambda lf: aggregate_cube(
+            lf.with_columns(pl.col("month").dt.year().alias("year")), [x, "town"]
+        ).rename({"quantile": "resale_price", "count": "transaction_volume"}),
+        source=load_cube(),
     )
 
-    custom_layout = {
-        "yaxis": dict(
-            range=[
-                chart_df["resale_price"].min() * 0.6,
-                chart_df["resale_price"].max() * 1.2,
-            ]
-        ),
-        "yaxis2": (
-            dict(range=[0, chart_df["transaction_volume"].max() * 15])
-            if show_transaction_volumes
-            else {}
-        ),
-    }
-
+    fig = build_town_figure(chart_df, x, show_transaction_volumes, webgl)
     fig.update_layout(
         title="Median Resale Price by Town",
         yaxis_title="Median Resale Price",
         hovermode="x unified",
         barmode="stack",
-        **custom_layout,
         **annotations,
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
 
 
 sf = SidebarFilter(
@@ -172,15 +142,11 @@ if group_by == "Town":
 
 st.markdown("### Download")
 st.write(
-    "Download the full dataset for resale flat prices based on registration date from Jan-2017 onwards"
+    "Download the full dataset for resale flat prices based on registration date from Jan-2017 onwards, or only the current selection"
 )
 st.write(
     "Note: the original dataset can be found here: [data.gov.sg](https://data.gov.sg/datasets/d_8b84c4ee58e3cfc0ece0d773c8ca6abc/view)."
 )
-st.download_button(
-    "Download CSV",
-    load_dataframe().write_csv(),
-    "hdb_resale_data.csv",
-    "text/csv",
-    key="download-csv",
-)
+download_data(lambda: sf.df, "hdb_resale_selection", key="download", full_dataset=True)
+
+show_perf_panel()
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+import streamlit as st
+
+FILTER_CACHE_ENTRIES = 64
+# the filter results are selected from the dataset, so their total is bounded
+# by a small multiple of it rather than growing with the number of sessions
+FILTER_CACHE_DATASET_MULTIPLE = 2
+MAP_CACHE_ENTRIES = 32
+MAP_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def estimate_size(value: Any) -> int:
+    if hasattr(value, "estimated_size"):
+        return value.estimated_size()
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(estimate_size(item) for item in value)
+    return 0
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache bounded by entries and by the
+    estimated size of the cached frames and rendered strings, counting hits
+    and misses.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        # computed outside the lock so that other sessions are not blocked
+        value = compute()
+        size = estimate_size(value)
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.size += size
+            while self.entries and (
+                len(self.entries) > self.max_entries or self.size > self.max_bytes
+            ):
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource
+def get_filter_cache() -> LRUCache:
+    """Return the cache of filter results shared by every session."""
+    # imported here since the dataset module depends on this one
+    from webapp.read import ensure_dataset
+
+    max_bytes = FILTER_CACHE_DATASET_MULTIPLE * ensure_dataset().stat().st_size
+    return LRUCache(FILTER_CACHE_ENTRIES, max_bytes)
+
+
+@st.cache_resource
+def get_map_cache() -> LRUCache:
+    """Return the cache of rendered map layers shared by every session."""
+    return LRUCache(MAP_CACHE_ENTRIES, MAP_CACHE_BYTES)
@@ -0,0 +1,222 @@
+import plotly.graph_objects as go
+import polars as pl
+
+from webapp.perf import timed
+
+# outliers drawn per town, sampled evenly from the sorted outliers
+MAX_OUTLIERS = 50
+
+
+@timed
+def build_town_figure(
+    chart_df: pl.DataFrame,
+    x: str = "quarter_label",
+    show_transaction_volumes: bool = False,
+    webgl: bool = False,
+) -> go.Figure:
+    """
+    Plot the median resale price, and optionally transaction volumes on a
+    secondary axis, of each town in `chart_df` against `x`.
+
+    The frame is partitioned by town once and the figure is validated in a
+    single pass over numpy columns, which plotly copies without walking them.
+    WebGL traces render faster with many towns but cannot draw splines.
+    """
+    chart_df = chart_df.sort(["town", x]).with_columns(
+        pl.col("resale_price").round().cast(pl.Int64)
+    )
+    partitions = chart_df.partition_by("town", maintain_order=True, as_dict=True)
+
+    line = dict(shape="linear") if webgl else dict(shape="spline")
+
+    traces = []
+    for (town,), town_df in partitions.items():
+        # categorical axis, so that years are not formatted as numbers
+        x_values = town_df[x].cast(pl.Utf8).to_numpy()
+        traces.append(
+            dict(
+                type="scattergl" if webgl else "scatter",
+                x=x_values,
+                y=town_df["resale_price"].to_numpy(),
+                mode="lines",
+                name=town,
+                hovertemplate="$%{y}",
+                line=line,
+            )
+        )
+
+        if show_transaction_volumes:
+            traces.append(
+                dict(
+                    type="bar",
+                    x=x_values,
+                    y=town_df["transaction_volume"].to_numpy(),
+                    name=town,
+                    hovertemplate="%{y} transactions",
+                    yaxis="y2",
+                )
+            )
+
+    layout = dict(
+        xaxis=dict(tickformat="%Y-%m"),
+        yaxis2=dict(
+            overlaying="y",
+            side="right",
+            showgrid=False,
+            zeroline=False,
+            showticklabels=False,
+        ),
+    )
+    if not chart_df.is_empty():
+        layout["yaxis"] = dict(
+            range=[
+                chart_df["resale_price"].min() * 0.6,
+                chart_df["resale_price"].max() * 1.2,
+            ]
+        )
+        if show_transaction_volumes:
+            layout["yaxis2"]["range"] = [0, chart_df["transaction_volume"].max() * 15]
+
+    return go.Figure(data=traces, layout=layout)
+
+
+@timed
+def build_line_figure(chart_df: pl.DataFrame, x: str, y: str, color: str) -> go.Figure:
+    """
+    Plot one line of `y` against `x` per `color` group, like px.line but
+    without converting the frame to pandas, which is slow to import.
+    """
+    chart_df = chart_df.sort([color, x])
+    partitions = chart_df.partition_by(color, maintain_order=True, as_dict=True)
+    return go.Figure(
+        data=[
+            dict(
+                type="scatter",
+                # categorical axis, so that quarters are not parsed as dates
+                x=group_df[x].cast(pl.Utf8).to_numpy(),
+                y=group_df[y].to_numpy(),
+                mode="lines",
+                name=str(group),
+            )
+            for (group,), group_df in partitions.items()
+        ]
+    )
+
+
+def box_stats(lf: pl.LazyFrame, by: str, value: str, max_outliers: int) -> pl.LazyFrame:
+    """
+    Compute the statistics of a Tukey box plot of `value` for each `by` group:
+    linearly interpolated quartiles like plotly's default, whiskers at the most
+    extreme values within 1.5 IQR of the box, and at most `max_outliers`
+    evenly spaced outliers beyond them.
+    """
+    column = pl.col(value)
+    q1 = column.quantile(0.25, interpolation="linear")
+    q3 = column.quantile(0.75, interpolation="linear")
+    lower_limit = q1 - 1.5 * (q3 - q1)
+    upper_limit = q3 + 1.5 * (q3 - q1)
+    # combining the two conditions fails to type on an empty frame, while the
+    # outliers below the box all sort before those above it
+    outliers = (
+        column.filter(column < lower_limit)
+        .sort()
+        .append(column.filter(column > upper_limit).sort())
+    )
+
+    return (
+        lf.group_by(by)
+        .agg(
+            pl.len().alias("count"),
+            q1.alias("q1"),
+            column.median().alias("median"),
+            q3.alias("q3"),
+            column.filter(column >= lower_limit).min().alias("lower_fence"),
+            column.filter(column <= upper_limit).max().alias("upper_fence"),
+            outliers.alias("outliers"),
+        )
+        .with_columns(
+            pl.col("outliers").list.gather_every(
+                (pl.col("outliers").list.len() / max_outliers)
+                .ceil()
+                .cast(pl.UInt32)
+                .clip(lower_bound=1)
+            )
+        )
+        .sort(by)
+    )
+
+
+@timed
+def build_box_figure(stats: pl.DataFrame, by: str, colors: list[str]) -> go.Figure:
+    """
+    Draw one box per row of `box_stats`, from its precomputed statistics, with
+    the sampled outliers as markers grouped with the box in the legend.
+    """
+    traces = []
+    for row, color in zip(stats.iter_rows(named=True), colors):
+        name = str(row[by])
+        traces.append(
+            go.Box(
+                x=[name],
+                q1=[row["q1"]],
+                median=[row["median"]],
+                q3=[row["q3"]],
+                lowerfence=[row["lower_fence"]],
+                upperfence=[row["upper_fence"]],
+                name=name,
+                legendgroup=name,
+                marker_color=color,
+                boxpoints=False,
+            )
+        )
+        if row["outliers"]:
+            traces.append(
+                go.Scatter(
+                    x=[name] * len(row["outliers"]),
+                    y=row["outliers"],
+                    mode="markers",
+                    name=name,
+                    legendgroup=name,
+                    showlegend=False,
+                    marker=dict(color=color, size=4),
+                    hovertemplate="<b>%{x}</b><br>Resale Price: %{y}<extra></extra>",
+                )
+            )
+    return go.Figure(data=traces)
+
+
+def bin_2d(
+    lf: pl.LazyFrame, x: str, y: str, x_size: float, y_size: float
+) -> pl.LazyFrame:
+    """Count the rows falling in each non-empty `x_size` by `y_size` bin."""
+    return (
+        lf.group_by(
+            ((pl.col(x) / x_size).floor() * x_size).alias(x),
+            ((pl.col(y) / y_size).floor() * y_size).alias(y),
+        )
+        .agg(pl.len().alias("count"))
+        .sort(x, y)
+    )
+
+
+@timed
+def build_density_figure(
+    bins: pl.DataFrame, x: str, y: str, x_size: float, y_size: float
+) -> go.Figure:
+    """
+    Draw the output of `bin_2d` as a 2D histogram. Only the occupied bins are
+    sent to the browser, one weighted point at the start of each, and plotly
+    lays them out on the regular grid given by the bin sizes.
+    """
+    return go.Figure(
+        go.Histogram2d(
+            x=bins[x].to_numpy(),
+            y=bins[y].to_numpy(),
+            z=bins["count"].to_numpy(),
+            histfunc="sum",
+            xbins=dict(start=bins[x].min(), size=x_size),
+            ybins=dict(start=bins[y].min(), size=y_size),
+            colorscale="Viridis",
+            colorbar=dict(title="Transactions"),
+        )
+    )
@@ -0,0 +1,102 @@
+import math
+from collections.abc import Sequence
+
+import polars as pl
+
+# relative error of quantiles merged from the sketches
+SKETCH_ACCURACY = 0.0025
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+CUBE_KEYS = ["month", "quarter_label", "town", "flat_type", "cat_remaining_lease_years"]
+
+
+def sketch_bucket(column: str) -> pl.Expr:
+    """Index of the logarithmic bucket (gamma^(i-1), gamma^i] holding each value."""
+    return (
+        (pl.col(column).cast(pl.Float64).log() / math.log(GAMMA)).ceil().cast(pl.Int32)
+    )
+
+
+def bucket_value(column: str) -> pl.Expr:
+    """Representative value of a bucket, within SKETCH_ACCURACY of its members."""
+    return 2 * pl.lit(GAMMA).pow(pl.col(column)) / (GAMMA + 1)
+
+
+def build_cube(df: pl.DataFrame, value: str = "resale_price") -> pl.DataFrame:
+    """
+    Aggregate transactions per month, town, flat type and lease bucket.
+
+    Each cell holds its count, exact median and a DDSketch style quantile sketch
+    of `value`: the sorted indices of the non-empty logarithmic buckets and
+    their counts. Sketches of any set of cells can be merged by adding the
+    counts of equal buckets.
+    """
+    return (
+        df.lazy()
+        .with_columns(sketch_bucket(value).alias("bucket"))
+        .sort("bucket")
+        .group_by(CUBE_KEYS)
+        .agg(
+            pl.len().cast(pl.UInt32).alias("count"),
+            pl.median(value).alias("median"),
+            pl.col("bucket").unique(maintain_order=True).alias("sketch_buckets"),
+            pl.col("bucket").unique_counts().alias("sketch_counts"),
+        )
+        .sort(CUBE_KEYS)
+        .collect()
+    )
+
+
+def aggregate_cube(
+    cube: pl.LazyFrame, by: Sequence[str], quantile: float = 0.5
+) -> pl.LazyFrame:
+    """
+    Merge the cells of the cube by `by`, returning their total `count` and the
+    `quantile` estimated from the merged sketches, interpolated like
+    `pl.quantile(..., interpolation="linear")`. Groups made of a single cell
+    use its exact median instead when `quantile` is 0.5.
+    """
+    by = list(by)
+    cells = cube.group_by(by).agg(
+        pl.len().alias("cells"), pl.sum("count"), pl.first("median")
+    )
+
+    rank = quantile * (pl.col("total") - 1)
+    estimates = (
+        cube.select(*by, "sketch_buckets", "sketch_counts")
+        .explode(["sketch_buckets", "sketch_counts"])
+        .group_by(*by, "sketch_buckets")
+        .agg(pl.sum("sketch_counts"))
+        .sort("sketch_buckets")
+        .with_columns(
+            pl.col("sketch_counts").cum_sum().over(by).alias("cumulative"),
+            pl.col("sketch_counts").sum().over(by).alias("total"),
+        )
+        .group_by(by)
+        .agg(
+            pl.col("sketch_buckets")
+            .filter(pl.col("cumulative") > rank.floor())
+            .min()
+            .alias("lower"),
+            pl.col("sketch_buckets")
+            .filter(pl.col("cumulative") > rank.ceil())
+            .min()
+            .alias("upper"),
+            (rank - rank.floor()).first().alias("weight"),
+        )
+        .select(
+            *by,
+            (
+                bucket_value("lower") * (1 - pl.col("weight"))
+                + bucket_value("upper") * pl.col("weight")
+            ).alias("estimate"),
+        )
+    )
+
+    estimate = pl.col("estimate")
+    if quantile == 0.5:
+        estimate = pl.when(pl.col("cells") == 1).then("median").otherwise(estimate)
+
+    return cells.join(estimates, on=by, how="left", join_nulls=True).select(
+        *by, "count", estimate.alias("quantile")
+    )
@@ -0,0 +1,53 @@
+from collections.abc import Callable
+
+import polars as pl
+import streamlit as st
+
+from webapp.perf import trace_fragment
+from webapp.read import DOWNLOAD_FORMATS, ensure_download, serialize_dataframe
+
+
+@st.fragment
+@trace_fragment
+def download_data(
+    selection: Callable[[], pl.DataFrame],
+    file_name: str,
+    key: str,
+    full_dataset: bool = False,
+):
+    """
+    Offer the rows returned by `selection`, and optionally the full dataset
+    prebuilt by the ETL, for download.
+
+    Nothing is read or serialised until a download is prepared, and the
+    widgets only rerun this fragment rather than the page.
+    """
+    scope = "Current selection"
+    col1, col2 = st.columns(2)
+    if full_dataset:
+        scope = col1.radio(
+            "Data",
+            ("Full dataset", "Current selection"),
+            horizontal=True,
+            key=f"{key}-scope",
+        )
+    download_format = col2.selectbox("Format", DOWNLOAD_FORMATS, key=f"{key}-format")
+    suffix, mime = DOWNLOAD_FORMATS[download_format]
+
+    if not st.button("Prepare download", key=f"{key}-prepare"):
+        return
+
+    if scope == "Full dataset":
+        path = ensure_download(download_format)
+        data, file_name = path.read_bytes(), path.name
+    else:
+        data = serialize_dataframe(selection(), download_format)
+        file_name = f"{file_name}.{suffix}"
+
+    st.download_button(
+        f"Download {file_name} ({len(data) / 1024 / 1024:.1f} MB)",
+        data,
+        file_name,
+        mime,
+        key=f"{key}-download",
+    )
@@ -1,11 +1,32 @@
+from collections.abc import Callable
+
 import polars as pl
 import streamlit as st
 from dateutil.relativedelta import relativedelta
 
-from webapp.read import load_dataframe
+from webapp.cache import get_filter_cache
+from webapp.perf import span
+from webapp.read import (
+    get_dataset_path,
+    load_dataframe,
+    load_metadata,
+    summarize_dataset,
+)
 
 
 class SidebarFilter:
+    """
+    Sidebar widgets that select a subset of the dataset.
+
+    The selections are combined into a single predicate over a lazy scan of the
+    dataset, and the widget options are computed from the dataset summary so
+    that nothing is materialised until `df` or `lazy()` is used.
+
+    Results over the canonical dataset are memoised in the shared filter cache,
+    keyed on the normalised selection, so reruns triggered by unrelated widgets
+    and other sessions with the same selection reuse them.
+    """
+
     def __init__(
         self,
         df: pl.DataFrame = None,
@@ -16,44 +37,116 @@ class SidebarFilter:
         select_lease_years=True,
         default_flat_type="ALL",
         default_town=None,
+        default_lease_years=(81, 99),
     ):
-        if not df:
-            df = load_dataframe()
-        self.df = df
-        self.min_date = min_date or self.df["month"].max() - relativedelta(months=12)
-        self.max_date = max_date or self.df["month"].max()
+        with span("filter.load"):
+            if df is None:
+                df = load_dataframe()
+                metadata = load_metadata()
+                # results are only shared for the canonical dataset, per version
+                self.version = get_dataset_path().stat().st_mtime_ns
+            else:
+                metadata = summarize_dataset(df)
+                self.version = None
+        self.source = df
+        self.metadata = metadata
+        self.predicate = pl.lit(True)
+        self.flat_type = None
+        self.lease_range = None
+        self._df = None
+
+        self.min_date = min_date or metadata["month"].max() - relativedelta(months=12)
+        self.max_date = max_date or metadata["month"].max()
         self.selected_towns = []
         self.default_flat_type = default_flat_type
         self.default_town = default_town
-
-        self.hide_elements()
-
-        self.start_date, self.end_date = self.create_slider()
-        self.df = self.df.filter(
-            (pl.col("month") >= self.start_date) & (pl.col("month") <= self.end_date)
+        self.default_lease_years = default_lease_years
+
+        with span("filter.widgets"):
+            self.hide_elements()
+
+            self.start_date, self.end_date = self.create_slider()
+            self.add_filter(pl.col("month").is_between(self.start_date, self.end_date))
+
+            if select_flat_type:
+                self.option_flat = self.create_flat_select()
+                self.filter_by_flat_type()
+
+            show_town_filter, town_filter_type = select_towns
+            if show_town_filter:
+                if town_filter_type == "single":
+                    self.selected_towns = self.create_town_select()
+
+                if town_filter_type == "multi":
+                    self.selected_towns = self.create_town_multiselect()
+
+            if self.selected_towns:
+                self.add_filter(pl.col("town").is_in(self.selected_towns))
+
+            if select_lease_years:
+                start_year, end_year = self.create_lease_select()
+                # the full range selects every row, so it is left out of the key. A
+                # default beyond the domain widens the slider past it
+                min_year, max_year = self.lease_domain
+                if start_year > min_year or end_year < max_year:
+                    self.lease_range = (start_year, end_year)
+                    # the last widget, so there are no later options to narrow
+                    self.predicate = self.predicate & pl.col(
+                        "remaining_lease_years"
+                    ).is_between(start_year, end_year)
+
+    def add_filter(self, predicate: pl.Expr):
+        """Narrow the selection, and the options offered by later widgets."""
+        self.predicate = self.predicate & predicate
+        self.metadata = self.metadata.filter(predicate)
+
+    def lazy(self, source: pl.DataFrame | None = None) -> pl.LazyFrame:
+        """
+        Return the selection as a lazy query that pages can extend. `source`
+        selects from another frame with the filtered columns, such as the cube.
+        """
+        source = self.source if source is None else source
+        return source.lazy().filter(self.predicate)
+
+    @property
+    def key(self) -> tuple:
+        """Normalised selection, equal for every widget state selecting the same rows."""
+        return (
+            self.version,
+            self.start_date,
+            self.end_date,
+            self.flat_type,
+            tuple(sorted(self.selected_towns)),
+            self.lease_range,
         )
 
-        if select_flat_type:
-            self.option_flat = self.create_flat_select()
-            self.df = self.filter_by_flat_type()
-
-        show_town_filter, town_filter_type = select_towns
-        if show_town_filter:
-            if town_filter_type == "single":
-                self.selected_towns = self.create_town_select()
-
-            if town_filter_type == "multi":
-                self.selected_towns = self.create_town_multiselect()
-
-        if self.selected_towns:
-            self.df = self.df.filter(pl.col("town").is_in(self.selected_towns))
-
-        if select_lease_years:
-            start_year, end_year = self.create_lease_select()
-            self.df = self.df.filter(
-                (pl.col("remaining_lease_years") >= start_year)
-                & (pl.col("remaining_lease_years") <= end_year)
-            )
+    def collect(
+        self,
+        name: str,
+        query: Callable[[pl.LazyFrame], pl.LazyFrame],
+        source: pl.DataFrame | None = None,
+    ) -> pl.DataFrame:
+        """
+        Run `query` over the selection, memoised on `name` and the selection.
+        `name` must identify everything besides the selection that `query`
+        depends on, including `source`.
+        """
+        with span("filter.collect", query=name) as collect_span:
+            if self.version is None:
+                result = query(self.lazy(source)).collect()
+            else:
+                result = get_filter_cache().get(
+                    (name, self.key), lambda: query(self.lazy(source)).collect()
+                )
+            collect_span.set(rows=result.height)
+        return result
+
+    @property
+    def df(self) -> pl.DataFrame:
+        """The selected rows, collected on first access."""
+        if self._df is None:
+            self._df = self.collect("rows", lambda lf: lf)
+        return self._df
 
     def hide_elements(self):
         hide_css = """
@@ -70,14 +163,14 @@ class SidebarFilter:
     def create_slider(self):
         return st.sidebar.slider(
             "Select date range",
-            min_value=self.df["month"].min(),
-            max_value=self.df["month"].max(),
+            min_value=self.metadata["month"].min(),
+            max_value=self.metadata["month"].max(),
             value=(self.min_date, self.max_date),
             format="YYYY-MM",
         )
 
     def create_flat_select(self):
-        flat_types = sorted(self.df["flat_type"].unique())
+        flat_types = sorted(self.metadata["flat_type"].unique())
         flat_types.insert(0, "ALL")
         return st.sidebar.selectbox(
             "Select flat type",
@@ -87,12 +180,11 @@ class SidebarFilter:
 
     def filter_by_flat_type(self):
         if self.option_flat != "ALL":
-            return self.df.filter(pl.col("flat_type") == self.option_flat)
-        else:
-            return self.df
+            self.flat_type = self.option_flat
+            self.add_filter(pl.col("flat_type") == self.option_flat)
 
     def create_town_select(self):
-        town_filter = sorted(self.df["town"].unique())
+        town_filter = sorted(self.metadata["town"].unique())
         if self.default_town in town_filter:
             default_index = town_filter.index(self.default_town)
         else:
@@ -106,7 +198,7 @@ class SidebarFilter:
         return [town]
 
     def create_town_multiselect(self):
-        town_filter = sorted(self.df["town"].unique())
+        town_filter = sorted(self.metadata["town"].unique())
         return st.sidebar.multiselect(
             "Select town(s)",
             options=town_filter,
@@ -117,9 +209,13 @@ class SidebarFilter:
         )
 
     def create_lease_select(self):
+        self.lease_domain = (
+            self.metadata["min_remaining_lease_years"].min(),
+            self.metadata["max_remaining_lease_years"].max(),
+        )
         return st.sidebar.slider(
             "Select remaining lease years",
-            min_value=self.df["remaining_lease_years"].min(),
-            max_value=self.df["remaining_lease_years"].max(),
-            value=(81, 99),
+            min_value=self.lease_domain[0],
+            max_value=self.lease_domain[1],
+            value=self.default_lease_years or self.lease_domain,
         )
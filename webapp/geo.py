@@ -0,0 +1,71 @@
+import math
+
+import polars as pl
+
+# transactions are located on the web mercator tile grid at this zoom level,
+# about 38 m per cell in Singapore, and coarser grids are derived from it
+MAX_CELL_ZOOM = 20
+CELLS = 2**MAX_CELL_ZOOM
+
+
+def map_cell(latitude: str = "latitude", longitude: str = "longitude") -> pl.Expr:
+    """Pack the web mercator tile (x, y) holding each location into one id."""
+    lat = pl.col(latitude).cast(pl.Float64).radians()
+    x = ((pl.col(longitude).cast(pl.Float64) + 180) / 360 * CELLS).floor()
+    y = ((1 - (lat.tan() + 1 / lat.cos()).log() / math.pi) / 2 * CELLS).floor()
+    return x.cast(pl.UInt64) * CELLS + y.cast(pl.UInt64)
+
+
+def cell_at_zoom(zoom: int, column: str = "map_cell") -> pl.Expr:
+    """Return the id of the coarser tile at `zoom` containing each cell."""
+    size = 2 ** (MAX_CELL_ZOOM - max(0, min(zoom, MAX_CELL_ZOOM)))
+    x = pl.col(column) // CELLS // size
+    y = pl.col(column) % CELLS // size
+    return x * CELLS + y
+
+
+def cluster_cells(lf: pl.LazyFrame, zoom: int, value: str) -> pl.LazyFrame:
+    """
+    Aggregate the rows into the tiles at `zoom`, returning the centroid, the
+    number of rows and the median `value` of each occupied tile.
+    """
+    return (
+        lf.drop_nulls("map_cell")
+        .group_by(cell_at_zoom(zoom).alias("cell"))
+        .agg(
+            pl.mean("latitude"),
+            pl.mean("longitude"),
+            pl.len().alias("count"),
+            pl.median(value),
+        )
+        .sort("cell")
+    )
+
+
+def within_bounds(bounds: dict | None) -> pl.Expr:
+    """Select the rows inside bounds in the format returned by Leaflet."""
+    if not bounds or not bounds.get("_southWest"):
+        return pl.lit(True)
+
+    south_west, north_east = bounds["_southWest"], bounds["_northEast"]
+    latitude = pl.col("latitude").is_between(south_west["lat"], north_east["lat"])
+    longitude = pl.col("longitude").is_between(south_west["lng"], north_east["lng"])
+    return latitude & longitude
+
+
+def to_feature_collection(df: pl.DataFrame, properties: list[str]) -> dict:
+    """Convert located rows into GeoJSON points carrying the given properties."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [row["longitude"], row["latitude"]],
+                },
+                "properties": {name: row[name] for name in properties},
+            }
+            for row in df.iter_rows(named=True)
+        ],
+    }
@@ -0,0 +1,60 @@
+from collections.abc import Sequence
+
+import polars as pl
+
+# HDB flats are sold on 99 year leases
+MAX_LEASE_YEARS = 99
+DEFAULT_LEASE_EDGES = (60, 80, MAX_LEASE_YEARS)
+
+
+def parse_lease_edges(text: str) -> tuple[int, ...]:
+    """
+    Parse comma separated bucket edges such as "60, 80, 99".
+
+    Edges ending below MAX_LEASE_YEARS get a last bucket up to it, so that
+    every lease falls in a bucket.
+    """
+    edges = tuple(int(edge) for edge in text.replace(" ", "").split(",") if edge)
+    if not edges or any(a >= b for a, b in zip(edges, edges[1:])) or edges[0] <= 0:
+        raise ValueError("Bucket edges must be positive and strictly increasing")
+    if edges[-1] < MAX_LEASE_YEARS:
+        edges += (MAX_LEASE_YEARS,)
+    return edges
+
+
+def get_lease_labels(edges: Sequence[int] = DEFAULT_LEASE_EDGES) -> list[str]:
+    """Return the labels for buckets ending at each edge, e.g. "61-80 years"."""
+    lower_bounds = [0] + [edge + 1 for edge in edges[:-1]]
+    return [f"{lower}-{upper} years" for lower, upper in zip(lower_bounds, edges)]
+
+
+def get_lease_dtype(edges: Sequence[int] = DEFAULT_LEASE_EDGES) -> pl.Enum:
+    return pl.Enum(get_lease_labels(edges))
+
+
+def remaining_lease_years(column: str = "remaining_lease") -> pl.Expr:
+    """Parse "NN years MM months" into fractional years."""
+    years = pl.col(column).str.extract(r"^(\d+) year", 1).cast(pl.Float32)
+    months = pl.col(column).str.extract(r"(\d+) month", 1).cast(pl.Float32)
+    return years + months.fill_null(0) / 12
+
+
+def bucket_lease(
+    column: str = "remaining_lease_years", edges: Sequence[int] = DEFAULT_LEASE_EDGES
+) -> pl.Expr:
+    """
+    Bucket whole lease years into (0, edges[0]], (edges[0], edges[1]], ...
+
+    Values outside (0, edges[-1]] are left null.
+    """
+    lower_bounds = [0] + list(edges[:-1])
+    conditions = [
+        (pl.col(column) > lower) & (pl.col(column) <= upper)
+        for lower, upper in zip(lower_bounds, edges)
+    ]
+    labels = get_lease_labels(edges)
+
+    expr = pl.when(conditions[0]).then(pl.lit(labels[0]))
+    for condition, label in zip(conditions[1:], labels[1:]):
+        expr = expr.when(condition).then(pl.lit(label))
+    return expr.cast(get_lease_dtype(edges))
@@ -1,5 +1,4 @@
-from PIL import Image
-
 from webapp.utils import get_project_root
 
-icon = Image.open(get_project_root() / "webapp" / "logo" / "favicon.ico")
+# a path, so that the favicon is served as is rather than decoded by PIL
+icon = str(get_project_root() / "webapp" / "logo" / "favicon.ico")
@@ -0,0 +1,87 @@
+import hashlib
+from collections.abc import Callable
+
+import folium
+import polars as pl
+from branca.element import Figure, MacroElement
+from folium.elements import ElementAddToElement
+from folium.map import Layer
+from folium.template import Template
+
+from webapp.cache import get_map_cache
+from webapp.perf import span
+
+
+class RenderedLayer(MacroElement):
+    """
+    A layer whose Leaflet script was rendered ahead of time. Adding it to a map
+    costs a string copy, and the script stays identical across reruns so the
+    browser keeps the drawn map.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            {{ this.script }}
+            {{ this.layer_name }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, script: str, layer_name: str):
+        super().__init__()
+        self._name = "RenderedLayer"
+        self.script = script
+        self.layer_name = layer_name
+
+    def render(self, **kwargs):
+        # st_folium reads the script from the template, while adding it to the
+        # figure would compile the whole script as a jinja template every run
+        pass
+
+
+def format_price(price: pl.Expr) -> pl.Expr:
+    """Format `price` to whole dollars with thousands separators, as in $1,234,567."""
+    digits = price.round().cast(pl.Int64).cast(pl.Utf8)
+    # group the digits in threes from the right, by grouping them reversed
+    grouped = digits.str.reverse().str.replace_all(r"(\d{3})", "${1},")
+    return pl.concat_str(pl.lit("$"), grouped.str.strip_chars_end(",").str.reverse())
+
+
+def fingerprint(df: pl.DataFrame) -> str:
+    """Digest the schema and rows of `df`, for use in cache keys."""
+    return hashlib.blake2b(df.write_ipc(None).getvalue(), digest_size=16).hexdigest()
+
+
+def scripts(element: MacroElement):
+    yield element._template.module.script(element)
+    for child in element._children.values():
+        yield from scripts(child)
+
+
+def render_layer(layer: Layer) -> tuple[str, str]:
+    """Render the Leaflet script of `layer`, without adding it to a map."""
+    Figure().add_child(folium.Map().add_child(layer))
+    layer.render()
+    script = "\n".join(
+        "\n".join(scripts(child))
+        for child in layer._children.values()
+        if not isinstance(child, ElementAddToElement)
+    )
+    return layer._template.module.script(layer) + script, layer.get_name()
+
+
+def cached_layer(
+    name: str, points: pl.DataFrame, build: Callable[[pl.DataFrame], Layer]
+) -> RenderedLayer:
+    """
+    Return the layer built from `points` by `build`, rendered once per distinct
+    `points` and shared by every session. `name` must identify everything
+    besides `points` that the layer depends on.
+    """
+    with span("maps.cached_layer", layer=name, rows=points.height) as layer_span:
+        script, layer_name = get_map_cache().get(
+            (name, fingerprint(points)), lambda: render_layer(build(points))
+        )
+        layer_span.set(bytes=len(script))
+    return RenderedLayer(script, layer_name)
@@ -1,10 +1,12 @@
 import numpy as np
-import plotly.express as px
 import streamlit as st
 
+from webapp.charts import MAX_OUTLIERS, box_stats, build_box_figure
 from webapp.filter import SidebarFilter
+from webapp.perf import begin_trace, plotly_chart, show_perf_panel
 
 st.set_page_config(layout="wide")
+begin_trace("Distribution of Town")
 
 st.title("📊 Distribution of Resale Price")
 st.write(
@@ -13,37 +15,36 @@ st.write(
 
 sf = SidebarFilter(select_towns=(False, ""), default_flat_type="4 ROOM")
 
-# Generate a rainbow color palette
-towns = sf.df["town"].unique()
-colors = ["hsl({}, 70%, 70%)".format(h) for h in np.linspace(0, 360, len(towns))]
-
-fig = px.box(
-    sf.df,
-    x="town",
-    y="resale_price",
-    color="town",
-    color_discrete_sequence=colors,
-    title="Distribution of Resale Prices by Town",
-    labels={"resale_price": "Resale Price", "town": "Town"},
+stats = sf.collect(
+    "box_stats",
+    lambda lf: box_stats(lf, "town", "resale_price", max_outliers=MAX_OUTLIERS),
 )
 
-fig.update_layout(
-    xaxis_title="Resale Price",
-    yaxis_title="Town",
-    height=900,
-    legend=dict(
-        y=-0.55,
-        orientation="h",
-        yanchor="bottom",
-        xanchor="right",
-        yref="container",
-        x=0.9,
-    ),
-)
-fig.update_traces(
-    hovertemplate="<b>%{x}</b><br>Resale Price: %{y}<br>",
-)
-
-fig.update_layout(hovermode="closest")
-
-st.plotly_chart(fig, use_container_width=True)
+if stats.is_empty():
+    st.warning("No data found for this combination of settings")
+else:
+    # Generate a rainbow color palette
+    colors = ["hsl({}, 70%, 70%)".format(h) for h in np.linspace(0, 360, stats.height)]
+
+    fig = build_box_figure(stats, "town", colors)
+
+    fig.update_layout(
+        title="Distribution of Resale Prices by Town",
+        legend_title="Town",
+        xaxis_title="Resale Price",
+        yaxis_title="Town",
+        height=900,
+        legend=dict(
+            y=-0.55,
+            orientation="h",
+            yanchor="bottom",
+            xanchor="right",
+            yref="container",
+            x=0.9,
+        ),
+    )
+    fig.update_layout(hovermode="closest")
+
+    plotly_chart(fig, use_container_width=True)
+
+show_perf_panel()
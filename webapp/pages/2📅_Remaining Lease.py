@@ -1,9 +1,18 @@
-import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
+from webapp.charts import bin_2d, build_density_figure
 from webapp.filter import SidebarFilter
+from webapp.lease import DEFAULT_LEASE_EDGES, bucket_lease, parse_lease_edges
+from webapp.perf import begin_trace, plotly_chart, show_perf_panel, span
+
+# transactions above which the scatter is drawn as a density by default
+POINT_THRESHOLD = 5000
+LEASE_BIN_SIZE = 1.0
+PRICE_BIN_SIZE = 20000
 
 st.set_page_config(layout="wide")
+begin_trace("Remaining Lease")
 
 st.title("📅 Remaining Lease")
 
@@ -12,50 +21,134 @@ st.write(
 )
 sf = SidebarFilter(select_lease_years=False, default_flat_type="4 ROOM")
 
-scatter_fig = px.scatter(
-    sf.df.sort(by="cat_remaining_lease_years"),
-    x="remaining_lease_years",
-    y="resale_price",
-    color="cat_remaining_lease_years",
-    hover_data=[
-        "remaining_lease_years",
-        "resale_price",
-        "address",
-        "storey_range",
-        "month",
-    ],
-    labels={
-        "remaining_lease_years": "Remaining Lease Years",
-        "resale_price": "Resale Price",
-        "cat_remaining_lease_years": "Remaining Lease Category",
-    },
+lease_edges = st.sidebar.text_input(
+    "Remaining lease categories",
+    value=", ".join(str(edge) for edge in DEFAULT_LEASE_EDGES),
+    help="Upper bound of each category in years, e.g. 60, 80, 99. Leases above "
+    "the last bound are grouped up to 99 years",
 )
+try:
+    lease_edges = parse_lease_edges(lease_edges)
+except ValueError as error:
+    st.sidebar.warning(f"Invalid categories, using the defaults: {error}")
+    lease_edges = DEFAULT_LEASE_EDGES
 
-scatter_fig.update_traces(
-    marker=dict(
-        size=6,
-        symbol="circle-open",
-        opacity=1,
-        line=dict(width=1.5),
-    ),
-    selector=dict(mode="markers"),
-    hovertemplate="<b>Price:</b> $%{y:,.3s}<br>"
-    + "<b>Lease Years:</b> %{x} years<br>"
-    + "<b>Address:</b> %{customdata[0]}<br>"
-    + "<b>Storey:</b> %{customdata[1]}<br>"
-    + "<b>Sold:</b> %{customdata[2]|%Y-%m}<br>",
+df = sf.df
+if lease_edges != DEFAULT_LEASE_EDGES:
+    df = df.with_columns(
+        bucket_lease(edges=lease_edges).alias("cat_remaining_lease_years")
+    )
+
+render_mode = st.sidebar.selectbox(
+    "Scatter rendering",
+    ("Auto", "Points", "Density"),
+    help="Auto draws individual points up to the threshold and a density above it",
 )
+point_threshold = st.sidebar.number_input(
+    "Point threshold", min_value=0, value=POINT_THRESHOLD, step=1000
+)
+if render_mode == "Auto":
+    render_mode = "Points" if df.height <= point_threshold else "Density"
+
+if render_mode == "Density":
+    lease_bin_size = st.sidebar.number_input(
+        "Lease years per bin", min_value=0.5, value=LEASE_BIN_SIZE, step=0.5
+    )
+    price_bin_size = st.sidebar.number_input(
+        "Resale price per bin ($)", min_value=1000, value=PRICE_BIN_SIZE, step=5000
+    )
+    with span("bin_2d") as bin_span:
+        bins = bin_2d(
+            df.lazy(),
+            "remaining_lease_years_exact",
+            "resale_price",
+            lease_bin_size,
+            price_bin_size,
+        ).collect()
+        bin_span.set(rows=bins.height)
 
-bar_fig = px.bar(
-    sf.df.group_by("cat_remaining_lease_years")
-    .len()
-    .sort(by="cat_remaining_lease_years"),
-    x="len",
-    y="cat_remaining_lease_years",
-    color="cat_remaining_lease_years",
-    orientation="h",
-    labels={"cat_remaining_lease_years": "Remaining Lease Category", "len": "Count"},
-    text="len",
+    scatter_fig = build_density_figure(
+        bins,
+        "remaining_lease_years_exact",
+        "resale_price",
+        lease_bin_size,
+        price_bin_size,
+    )
+    scatter_fig.update_traces(
+        hovertemplate="<b>Lease Years:</b> %{x} years<br>"
+        + "<b>Price:</b> $%{y}<br>"
+        + "<b>Transactions:</b> %{z}<extra></extra>",
+    )
+    scatter_fig.update_layout(
+        xaxis_title="Remaining Lease Years", yaxis_title="Resale Price"
+    )
+else:
+    with span("scatter figure", rows=df.height):
+        partitions = df.sort(by="cat_remaining_lease_years").partition_by(
+            "cat_remaining_lease_years", maintain_order=True, as_dict=True
+        )
+        scatter_fig = go.Figure(
+            [
+                dict(
+                    # WebGL above the point count at which plotly express switches
+                    type="scattergl" if df.height > 1000 else "scatter",
+                    x=category_df["remaining_lease_years_exact"].to_numpy(),
+                    y=category_df["resale_price"].to_numpy(),
+                    customdata=category_df.select(
+                        "address", "storey_range", "month"
+                    ).to_numpy(),
+                    mode="markers",
+                    name=category,
+                )
+                for (category,), category_df in partitions.items()
+            ]
+        )
+    scatter_fig.update_layout(
+        xaxis_title="Remaining Lease Years",
+        yaxis_title="Resale Price",
+        legend_title="Remaining Lease Category",
+    )
+
+    scatter_fig.update_traces(
+        marker=dict(
+            size=6,
+            symbol="circle-open",
+            opacity=1,
+            line=dict(width=1.5),
+        ),
+        selector=dict(mode="markers"),
+        hovertemplate="<b>Price:</b> $%{y:,.3s}<br>"
+        + "<b>Lease Years:</b> %{x:.1f} years<br>"
+        + "<b>Address:</b> %{customdata[0]}<br>"
+        + "<b>Storey:</b> %{customdata[1]}<br>"
+        + "<b>Sold:</b> %{customdata[2]|%Y-%m}<br>",
+    )
+
+counts = (
+    df.group_by("cat_remaining_lease_years").len().sort(by="cat_remaining_lease_years")
+)
+bar_fig = go.Figure(
+    [
+        go.Bar(
+            x=[count],
+            y=[category],
+            text=[count],
+            name=category,
+            orientation="h",
+            hovertemplate="Remaining Lease Category=%{y}<br>Count=%{text}<extra></extra>",
+        )
+        for category, count in counts.iter_rows()
+    ]
+)
+bar_fig.update_layout(
+    xaxis_title="Count",
+    yaxis=dict(
+        title="Remaining Lease Category",
+        # the first category on top
+        categoryorder="array",
+        categoryarray=counts["cat_remaining_lease_years"].reverse().to_list(),
+    ),
+    legend_title="Remaining Lease Category",
 )
 
 scatter_fig.update_layout(height=600)
@@ -63,5 +156,7 @@ bar_fig.update_layout(height=250)
 bar_fig.update_traces(textposition="outside", selector=dict(type="bar"))
 
 
-st.plotly_chart(scatter_fig, use_container_width=True)
-st.plotly_chart(bar_fig, use_container_width=True)
+plotly_chart(scatter_fig, chart="scatter", use_container_width=True)
+plotly_chart(bar_fig, chart="bar", use_container_width=True)
+
+show_perf_panel()
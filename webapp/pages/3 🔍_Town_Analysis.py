@@ -1,13 +1,27 @@
 import folium
 import polars as pl
 import streamlit as st
-from folium.plugins import FastMarkerCluster
-from PIL import Image
 from streamlit_folium import st_folium
 
+from webapp.download import download_data
 from webapp.filter import SidebarFilter
+from webapp.geo import cluster_cells, to_feature_collection, within_bounds
+from webapp.maps import cached_layer, format_price
+from webapp.perf import begin_trace, show_perf_panel, span
+from webapp.query import latest_per_key
+
+# below MARKER_ZOOM transactions are clustered on a grid CELL_ZOOM_OFFSET zoom
+# levels finer than the map tiles, above it the visible ones are drawn unless
+# there are more than MAX_MARKERS of them
+DEFAULT_ZOOM = 12
+MARKER_ZOOM = 16
+CELL_ZOOM_OFFSET = 3
+MAX_MARKERS = 1000
+
+colors = {"Low": "green", "Medium": "orange", "High": "red"}
 
 st.set_page_config(layout="wide")
+begin_trace("Town Analysis")
 
 st.title("🔍 Town Analysis")
 
@@ -88,52 +102,10 @@ try:
         prefer_canvas=True,
     )
 
-    callback = """
-        function(row) {
-            var lat = row[0];
-            var lng = row[1];
-            var address = row[2];
-            var month = row[3];
-            var level = row[4];
-            var price = row[5];
-            var lease = row[6];
-            var cat_resale_price = row[7];
-
-            var color = cat_resale_price === "Low" ? "green" :
-                        cat_resale_price === "Medium" ? "orange" : "red";
-
-            var html = `
-                <div style="font-family: 'Source Sans Pro', sans-serif; line-height: 1.5; padding: 3px;">
-                    <b style="font-size: 16px;">${address}</b>
-                    <p style="margin: 10px 0; font-size: 14px;">
-                        <span style="font-weight: bold;">Sold:</span> ${month}<br>
-                        <span style="font-weight: bold;">Storey:</span> ${level}<br>
-                        <span style="font-weight: bold;">Price:</span> $${price.toLocaleString()}<br>
-                        <span style="font-weight: bold;">Remaining Lease:</span> ${lease} years
-                    </p>
-                </div>
-            `;
-
-            var icon = L.AwesomeMarkers.icon({
-                icon: 'home',
-                markerColor: color,
-                prefix: 'fa'
-            });
-
-            var marker = L.marker(new L.LatLng(lat, lng), {icon: icon});
-            marker.bindPopup(html);
-            marker.bindTooltip(html, {sticky: true});
-            return marker;
-        }
-    """
-
     if show_all:
         filtered_data = filtered_sub
     else:
-        latest_transactions = filtered_sub.group_by("address").agg(
-            pl.all().sort_by("month").last()
-        )
-        filtered_data = latest_transactions
+        filtered_data = latest_per_key(filtered_sub.lazy(), "address").collect()
 
     filtered_data = filtered_data.with_columns(
         [
@@ -141,33 +113,72 @@ try:
         ]
     )
 
-    data = (
-        filtered_data.select(
-            [
-                "latitude",
-                "longitude",
-                "address",
-                "month",
-                "storey_range",
-                "resale_price",
-                "remaining_lease_years",
-                "cat_resale_price",
-            ]
-        )
-        .to_numpy()
-        .tolist()
+    # the zoom and bounds reported by the map on the previous run
+    map_state = st.session_state.get("town_map") or {}
+    zoom = map_state.get("zoom") or DEFAULT_ZOOM
+    visible = filtered_data.drop_nulls(["latitude", "longitude"]).filter(
+        within_bounds(map_state.get("bounds"))
     )
-    marker_cluster = FastMarkerCluster(
-        data,
-        callback=callback,
-        name="Resale Flats",
-    ).add_to(sg_map)
 
-    folium.LayerControl().add_to(sg_map)
+    if zoom >= MARKER_ZOOM and visible.height > MAX_MARKERS:
+        st.caption(
+            f"{visible.height:,} transactions are in view, more than the "
+            f"{MAX_MARKERS:,} drawn individually. Zoom in further to see them."
+        )
 
-    folium_object = sg_map
-    if show_all:
-        folium_object = marker_cluster
+    if zoom >= MARKER_ZOOM and visible.height <= MAX_MARKERS:
+        points = visible.with_columns(
+            pl.col("cat_resale_price").replace_strict(colors).alias("color"),
+            format_price(pl.col("resale_price")).alias("price"),
+            pl.format("{} years", "remaining_lease_years").alias("lease"),
+        )
+        fields = ["address", "month", "storey_range", "price", "lease"]
+        aliases = ["Address", "Sold", "Storey", "Price", "Remaining Lease"]
+        radius = pl.lit(6)
+    else:
+        with span("cluster_cells", zoom=zoom) as cluster_span:
+            points = cluster_cells(
+                visible.lazy(), zoom + CELL_ZOOM_OFFSET, "resale_price"
+            ).collect()
+            cluster_span.set(rows=points.height)
+        points = points.with_columns(
+            pl.when(pl.col("resale_price") < median_resale_price - threshold)
+            .then(pl.lit(colors["Low"]))
+            .when(pl.col("resale_price") > median_resale_price + threshold)
+            .then(pl.lit(colors["High"]))
+            .otherwise(pl.lit(colors["Medium"]))
+            .alias("color"),
+            format_price(pl.col("resale_price")).alias("price"),
+        )
+        fields = ["count", "price"]
+        aliases = ["Transactions", "Median Price"]
+        radius = 4 + 2 * pl.col("count").log(2)
+
+    # styled in the browser from each feature's style property
+    points = points.select(
+        "latitude",
+        "longitude",
+        *fields,
+        pl.struct(
+            "color", pl.col("color").alias("fillColor"), radius.round(1).alias("radius")
+        ).alias("style"),
+    )
+
+    # a single layer sharing one tooltip template keeps the page size
+    # proportional to the number of points drawn, and is only rendered again
+    # when the points change. The tooltip needs a feature to read the fields
+    # from, so a view without transactions is left empty
+    layer = folium.FeatureGroup(name="Resale Flats")
+    if points.height:
+        cached_layer(
+            f"town_map_{'_'.join(fields)}",
+            points,
+            lambda points: folium.GeoJson(
+                to_feature_collection(points, [*fields, "style"]),
+                marker=folium.CircleMarker(fill=True, fill_opacity=0.6),
+                tooltip=folium.GeoJsonTooltip(fields=fields, aliases=aliases),
+            ),
+        ).add_to(layer)
 
     sw = (
         filtered.select([pl.col("latitude").min(), pl.col("longitude").min()])
@@ -185,28 +196,23 @@ try:
 
     sg_map.fit_bounds([sw, ne])
 
-    image = Image.open("assets/resale_price_legends.png")
-
-    st.image(image)
+    st.image("assets/resale_price_legends.png")
 
-    st_data = st_folium(sg_map, use_container_width=True, returned_objects=[])
+    with span("st_folium"):
+        st_data = st_folium(
+            sg_map,
+            key="town_map",
+            feature_group_to_add=layer,
+            returned_objects=["zoom", "bounds"],
+            use_container_width=True,
+        )
 
 except TypeError as error:
     st.warning(f"No data found for this combination of settings: {error}")
 
 
-def convert_df(df: pl.DataFrame):
-    return df.write_csv().encode("utf-8")
-
-
-csv = convert_df(filtered_sub)
-st.download_button(
-    "Download Filtered Data",
-    csv,
-    "filtered_data.csv",
-    "text/csv",
-    key="download-csv",
-)
+st.markdown("##### Download Filtered Data")
+download_data(lambda: filtered_sub, "filtered_data", key="download")
 
 
 simple_df = filtered.select(
@@ -223,4 +229,7 @@ simple_df = filtered.select(
 st.write("")
 st.write("Data points as shown on map:")
 
-st.dataframe(simple_df, use_container_width=True)
+with span("st.dataframe", rows=simple_df.height):
+    st.dataframe(simple_df, use_container_width=True)
+
+show_perf_panel()
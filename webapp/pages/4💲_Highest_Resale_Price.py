@@ -5,12 +5,27 @@ import streamlit as st
 from streamlit_folium import st_folium
 
 from webapp.filter import SidebarFilter
+from webapp.geo import to_feature_collection
+from webapp.maps import cached_layer, format_price
+from webapp.perf import begin_trace, plotly_chart, show_perf_panel, span
+from webapp.query import TOP_PARTIAL_N, partials_answer_lease_range, top_n_per_group
+from webapp.read import load_top_partials
+
+# columns ranked together for each grouping offered in the sidebar
+GROUPINGS = {
+    "Town": ["town"],
+    "Flat type": ["flat_type"],
+    "Town and flat type": ["town", "flat_type"],
+}
+
+PIN_COLORS = {"Above": "red", "Below": "green"}
 
 st.set_page_config(layout="wide")
+begin_trace("Highest Resale Price")
 
 st.title("💲Highest Resale Price")
 st.write(
-    "The unit with the highest resale price per town by flat type is plotted below."
+    "The units with the highest resale price per town by flat type are plotted below."
 )
 st.write(
     "The colour of the pins reflect whether the unit is below or above the median value. Red indicates above median while green indicates below median"
@@ -18,27 +33,32 @@ st.write(
 
 sf = SidebarFilter(select_towns=(True, "multi"))
 
-# get highest price flat by town
-highest_price = sf.df.filter(
-    pl.col("resale_price") == pl.col("resale_price").max().over(["town", "flat_type"])
+grouping = st.sidebar.selectbox("Group by", GROUPINGS.keys())
+by = GROUPINGS[grouping]
+n = st.sidebar.number_input(
+    "Units per group", min_value=1, max_value=TOP_PARTIAL_N, value=1
 )
 
-highest_price_per_town = highest_price.group_by("town").agg(
-    pl.max("resale_price").alias("max_resale_price")
+# the top partials hold the highest prices of every month, town, flat type and
+# lease category, which contain the answer unless the selection cuts through
+# those cells
+if partials_answer_lease_range(sf.lease_range):
+    source, source_name = load_top_partials(), "partials"
+else:
+    source, source_name = None, "rows"
+
+highest_price_per_town = sf.collect(
+    f"top_{n}_{'_'.join(by)}_{source_name}",
+    lambda lf: top_n_per_group(lf, by, n),
+    source=source,
 )
-
-highest_price_per_town = highest_price.join(
-    highest_price_per_town,
-    left_on=["town", "resale_price"],
-    right_on=["town", "max_resale_price"],
-    how="inner",
+label = pl.concat_str(by, separator=" / ")
+if n > 1:
+    label = pl.concat_str(label, pl.lit(" #"), pl.col("rank"))
+highest_price_per_town = highest_price_per_town.with_columns(label.alias("group")).sort(
+    "resale_price"
 )
 
-highest_price_per_town = highest_price_per_town.unique(
-    subset=["town", "resale_price"]
-).sort("town")
-highest_price_per_town = highest_price_per_town.sort("resale_price")
-
 ####################
 ### MAP PLOTTING ###
 ####################
@@ -60,42 +80,40 @@ sg_map = folium.Map(
     zoom_start=12,
     attr="OpenStreetMap",
 )
-for month, lat, lon, address, town, price, lease, level in zip(
-    highest_price_per_town["month"],
-    highest_price_per_town["latitude"],
-    highest_price_per_town["longitude"],
-    highest_price_per_town["address"],
-    highest_price_per_town["town"],
-    highest_price_per_town["resale_price"],
-    highest_price_per_town["remaining_lease_years"],
-    highest_price_per_town["storey_range"],
-):
-    # pin colour
-    if price > median_price:
-        color = "red"
-    else:
-        color = "green"
-
-    # html for popup
-    html = f"""
-        <div style="font-family: 'Source Sans Pro', sans-serif; line-height: 1.5; padding: 3px;">
-            <b style="font-size: 16px;">{address}</b>
-            <p style="margin: 10px 0; font-size: 14px;">
-                <span style="font-weight: bold;">Sold:</span> {month}<br>
-                <span style="font-weight: bold;">Storey:</span> {level}<br>
-                <span style="font-weight: bold;">Price:</span> ${round(price):,}</span><br>
-                <span style="font-weight: bold;">Remaining Lease:</span> {lease} years
-            </p>
-        </div>
-    """
-
-    popup = folium.Popup(html, max_width=170)
-    folium.Marker(
-        [lat, lon],
-        popup=popup,
-        tooltip=html,
-        icon=folium.Icon(color=color, icon="home", prefix="fa"),
-    ).add_to(sg_map)
+# the pins are drawn from two GeoJSON layers of fixed colour, and rendered
+# again only when the units shown change
+points = highest_price_per_town.drop_nulls(["latitude", "longitude"]).select(
+    "latitude",
+    "longitude",
+    "median_category",
+    "address",
+    pl.col("month").cast(pl.Utf8),
+    "storey_range",
+    format_price(pl.col("resale_price")).alias("price"),
+    pl.format("{} years", "remaining_lease_years").alias("lease"),
+)
+fields = ["address", "month", "storey_range", "price", "lease"]
+aliases = ["Address", "Sold", "Storey", "Price", "Remaining Lease"]
+
+
+def build_pins(points: pl.DataFrame) -> folium.FeatureGroup:
+    pins = folium.FeatureGroup()
+    for category, color in PIN_COLORS.items():
+        folium.GeoJson(
+            to_feature_collection(
+                points.filter(pl.col("median_category") == category), fields
+            ),
+            marker=folium.Marker(
+                icon=folium.Icon(color=color, icon="home", prefix="fa")
+            ),
+            tooltip=folium.GeoJsonTooltip(fields=fields, aliases=aliases),
+            popup=folium.GeoJsonPopup(fields=fields, aliases=aliases),
+        ).add_to(pins)
+    return pins
+
+
+layer = folium.FeatureGroup(name="Highest Resale Prices")
+cached_layer("highest_price_map", points, build_pins).add_to(layer)
 
 sw = (
     highest_price_per_town.select([pl.col("latitude").min(), pl.col("longitude").min()])
@@ -113,7 +131,14 @@ ne = (
 
 sg_map.fit_bounds([sw, ne])
 
-st_data = st_folium(sg_map, use_container_width=True)
+with span("st_folium"):
+    st_data = st_folium(
+        sg_map,
+        key="highest_price_map",
+        feature_group_to_add=layer,
+        returned_objects=[],
+        use_container_width=True,
+    )
 
 ##########################
 ### BAR CHART PLOTTING ###
@@ -121,11 +146,11 @@ st_data = st_folium(sg_map, use_container_width=True)
 fig = px.bar(
     highest_price_per_town.sort(by="resale_price"),
     x="resale_price",
-    y="town",
+    y="group",
     color="median_category",
     color_discrete_map={"Below": "#71af26", "Above": "#d53e2a"},
-    labels={"resale_price": "Highest Resale Price", "town": "Town"},
-    title="Highest Resale Price per Town",
+    labels={"resale_price": "Highest Resale Price", "group": grouping},
+    title=f"Highest Resale Price per {grouping}",
 )
 
 fig.add_shape(
@@ -139,9 +164,11 @@ fig.add_shape(
 
 # Update layout
 fig.update_layout(
-    yaxis_title="Town",
+    yaxis_title=grouping,
     xaxis_title=f"Highest Resale Price (median: ${round(median_price/1000):,.0f}K)",
     height=700,
 )
 
-st.plotly_chart(fig, height=700)
+plotly_chart(fig, height=700)
+
+show_perf_panel()
@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+import polars as pl
+import streamlit as st
+
+from webapp.cache import get_filter_cache, get_map_cache
+
+# set to 1 to trace every session, while ?perf=1 traces a single session
+PERF_ENV = "HDB_KAKI_PERF"
+# file that the spans of traced reruns are appended to, as JSON lines
+PERF_LOG_ENV = "HDB_KAKI_PERF_LOG"
+
+# fields shown in their own columns of the panel, the rest are listed as details
+RECORD_FIELDS = {
+    "timestamp",
+    "page",
+    "rerun",
+    "span",
+    "depth",
+    "start_ms",
+    "ms",
+    "rows",
+    "bytes",
+}
+
+# the trace of the rerun running on this thread, None when it is not traced
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Span:
+    """Fields recorded with a span, such as row counts and payload sizes."""
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+class NullSpan:
+    def set(self, **fields):
+        pass
+
+
+# shared by every span of a rerun that is not traced
+NULL_SPAN = nullcontext(NullSpan())
+
+
+class Trace:
+    def __init__(self, page: str):
+        self.page = page
+        self.rerun = uuid.uuid4().hex[:8]
+        self.timestamp = time.time()
+        self.started_at = time.perf_counter()
+        self.depth = 0
+        self.records = []
+
+
+def begin_trace(page: str):
+    """Start tracing this rerun of `page`, if tracing is enabled."""
+    enabled = os.environ.get(PERF_ENV) == "1" or st.query_params.get("perf") == "1"
+    _local.trace = Trace(page) if enabled else None
+
+
+def write_log(record: dict):
+    path = os.environ.get(PERF_LOG_ENV)
+    if not path:
+        return
+    with _log_lock, open(path, "a") as file:
+        file.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def _span(trace: Trace, name: str, fields: dict):
+    span = Span(fields)
+    started_at = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield span
+    finally:
+        trace.depth -= 1
+        record = {
+            "timestamp": round(trace.timestamp, 3),
+            "page": trace.page,
+            "rerun": trace.rerun,
+            "span": name,
+            "depth": trace.depth,
+            "start_ms": round((started_at - trace.started_at) * 1000, 2),
+            "ms": round((time.perf_counter() - started_at) * 1000, 2),
+            **span.fields,
+        }
+        trace.records.append(record)
+        write_log(record)
+
+
+def span(name: str, **fields):
+    """
+    Time the block as `name` along with `fields`, and those set on the yielded
+    span. Outside a traced rerun nothing is recorded and the block runs as is.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return NULL_SPAN
+    return _span(trace, name, fields)
+
+
+def plotly_chart(figure, chart: str | None = None, **kwargs):
+    """
+    Draw `figure` with st.plotly_chart as a span, recording the bytes of the
+    figure's JSON sent to the browser. `chart` tells apart the charts of a page.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return st.plotly_chart(figure, **kwargs)
+
+    # serialised before the span, so that it times the chart as drawn untraced
+    fields = {"bytes": len(figure.to_json())}
+    if chart is not None:
+        fields["chart"] = chart
+    with _span(trace, "st.plotly_chart", fields):
+        return st.plotly_chart(figure, **kwargs)
+
+
+def measure(value) -> dict:
+    if isinstance(value, pl.DataFrame):
+        return {"rows": value.height}
+    if isinstance(value, (str, bytes)):
+        return {"bytes": len(value)}
+    return {}
+
+
+def timed(function):
+    """Record each call of `function` as a span, with the rows or bytes returned."""
+    name = f"{function.__module__.removeprefix('webapp.')}.{function.__qualname__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, "trace", None) is None:
+            return function(*args, **kwargs)
+
+        with _span(_local.trace, name, {}) as span:
+            result = function(*args, **kwargs)
+            span.set(**measure(result))
+        return result
+
+    return wrapper
+
+
+def trace_fragment(function):
+    """
+    Trace the reruns of the fragment `function` that run without its page,
+    which has finished its own trace. A fragment cannot draw in the sidebar, so
+    their spans are only written to the log.
+    """
+    name = f"{function.__module__.removeprefix('webapp.')}.{function.__qualname__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, "trace", None) is not None:
+            return function(*args, **kwargs)
+
+        begin_trace(name)
+        try:
+            with span(name):
+                return function(*args, **kwargs)
+        finally:
+            _local.trace = None
+
+    return wrapper
+
+
+def show_perf_panel():
+    """
+    Show the spans of this rerun and the shared cache statistics in the
+    sidebar, which ends the trace of the rerun.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return
+    _local.trace = None
+
+    total = (time.perf_counter() - trace.started_at) * 1000
+    # a span starts before those nested in it, which may round to the same time
+    records = sorted(
+        trace.records, key=lambda record: (record["start_ms"], record["depth"])
+    )
+
+    with st.sidebar.expander("Performance", expanded=True):
+        st.write(f"Rerun `{trace.rerun}` took `{total:,.0f} ms`")
+        st.dataframe(
+            pl.DataFrame(
+                [
+                    {
+                        "span": "· " * record["depth"] + record["span"],
+                        "ms": record["ms"],
+                        "rows": record.get("rows"),
+                        "bytes": record.get("bytes"),
+                        "details": ", ".join(
+                            f"{key}={value}"
+                            for key, value in record.items()
+                            if key not in RECORD_FIELDS
+                        ),
+                    }
+                    for record in records
+                ],
+                schema={
+                    "span": pl.Utf8,
+                    "ms": pl.Float64,
+                    "rows": pl.Int64,
+                    "bytes": pl.Int64,
+                    "details": pl.Utf8,
+                },
+            ),
+            hide_index=True,
+        )
+        st.dataframe(
+            pl.DataFrame(
+                [
+                    {"cache": name, **cache.stats()}
+                    for name, cache in (
+                        ("filter", get_filter_cache()),
+                        ("map", get_map_cache()),
+                    )
+                ]
+            ),
+            hide_index=True,
+        )
+        st.download_button(
+            "Download spans",
+            "".join(json.dumps(record, default=str) + "\n" for record in records),
+            f"perf_{trace.rerun}.jsonl",
+            "application/jsonl",
+            key="perf-download",
+        )
@@ -0,0 +1,76 @@
+from collections.abc import Sequence
+
+import polars as pl
+
+from webapp.lease import DEFAULT_LEASE_EDGES
+
+# the dataset is sorted in this order when it is built
+DATASET_ORDER = ["town", "month", "_id"]
+
+# depth of the precomputed top partials, and so the largest N they can answer
+TOP_PARTIAL_N = 10
+TOP_PARTIAL_KEYS = ["month", "town", "flat_type", "cat_remaining_lease_years"]
+
+# keys whose values all belong to a single town
+TOWN_NESTED_KEYS = {"address", "postal"}
+
+
+def latest_per_key(lf: pl.LazyFrame, key: str | Sequence[str]) -> pl.LazyFrame:
+    """
+    Keep the latest transaction of each `key`, e.g. per address, block or
+    postal code.
+
+    The dataset is sorted by DATASET_ORDER and filters preserve that order, so
+    the transactions of a key within a town are already in chronological
+    order and the latest one is simply the last row seen. Keys spanning
+    several towns are ordered by month first.
+    """
+    key = [key] if isinstance(key, str) else list(key)
+    if "town" not in key and not set(key) & TOWN_NESTED_KEYS:
+        lf = lf.sort(DATASET_ORDER[1:], maintain_order=True)
+    return lf.unique(subset=key, keep="last", maintain_order=True)
+
+
+def top_n_per_group(
+    lf: pl.LazyFrame,
+    by: str | Sequence[str],
+    n: int,
+    value: str = "resale_price",
+) -> pl.LazyFrame:
+    """
+    Keep the `n` rows with the highest `value` in each `by` group, in one
+    windowed pass. Ties are broken by row order, so the earliest of equally
+    priced transactions in DATASET_ORDER is kept.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    rank = pl.col(value).rank("ordinal", descending=True).over(by)
+    return lf.filter(rank <= n).with_columns(rank.alias("rank")).sort([*by, "rank"])
+
+
+def partials_answer_lease_range(lease_range: tuple[int, int] | None) -> bool:
+    """
+    Whether the top partials answer a range of remaining lease years, which
+    is when it covers whole lease categories, such as the 81-99 years default.
+    """
+    if lease_range is None:
+        return True
+    start_year, end_year = lease_range
+    return (
+        start_year - 1 in (0, *DEFAULT_LEASE_EDGES[:-1])
+        and end_year in DEFAULT_LEASE_EDGES
+    )
+
+
+def build_top_partials(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Keep the TOP_PARTIAL_N most expensive transactions of every month, town,
+    flat type and lease category. The top N <= TOP_PARTIAL_N of any union of
+    these cells is contained in the union of their partials, so date range
+    queries can be answered from a few rows per cell.
+    """
+    return (
+        top_n_per_group(df.lazy(), TOP_PARTIAL_KEYS, TOP_PARTIAL_N)
+        .drop("rank")
+        .sort(DATASET_ORDER, maintain_order=True)
+        .collect()
+    )
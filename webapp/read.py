@@ -1,19 +1,34 @@
+import gzip
+import io
+import os
+import tempfile
+from collections.abc import Callable
 from datetime import datetime
 from pathlib import Path
 
 import polars as pl
 import streamlit as st
-from pybadges import badge
 
+from webapp.cube import build_cube
+from webapp.perf import timed
+from webapp.query import DATASET_ORDER, build_top_partials
+from webapp.schema import schema
 from webapp.utils import get_project_root
 
+# file suffix and MIME type of each format the dataset can be downloaded in
+DOWNLOAD_FORMATS = {
+    "CSV": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
 
-def get_last_updated_badge():
-    data_dir = get_project_root() / "data"
-    with open(data_dir / "metadata") as file:
-        content = int(file.read())
-        last_updated = datetime.fromtimestamp(content)
+@st.cache_data(max_entries=1)
+def render_last_updated_badge(path: Path, modified_at: float) -> str:
+    # imported here since pybadges loads pkg_resources, which is slow to import
+    from pybadges import badge
 
+    last_updated = datetime.fromtimestamp(int(path.read_text()))
     return badge(
         left_text="last updated",
         right_text=last_updated.isoformat()[:10],
@@ -22,14 +37,11 @@ def get_last_updated_badge():
     )
 
 
-def convert_lease(x):
-    if 0 < x <= 60:
-        result = "0-60 years"
-    elif 60 < x <= 80:
-        result = "61-80 years"
-    elif 80 < x <= 99:
-        result = "81-99 years"
-    return result
+@timed
+def get_last_updated_badge() -> str:
+    """Return the SVG badge of the last update, rendered once per update."""
+    path = get_project_root() / "data" / "metadata"
+    return render_last_updated_badge(path, path.stat().st_mtime)
 
 
 def get_dataframe_from_csv() -> pl.DataFrame:
@@ -41,58 +53,198 @@ def get_dataframe_from_csv() -> pl.DataFrame:
 
 
 def get_dataframe_from_parquet() -> pl.DataFrame:
-    """Combine all CSV files in the specified directory into a single DataFrame."""
+    """Combine all monthly parquet partitions into a single DataFrame."""
     data_dir: Path = get_project_root() / "data"
 
-    df = pl.read_parquet(data_dir / "df.parquet")
-    return df.sort(by="town")
+    # a global string cache lets the partitions share categorical encodings
+    with pl.StringCache():
+        df = pl.read_parquet(data_dir / "parquet" / "*.parquet")
+
+    df = encode_categories(df)
+    # rows of a town are in transaction order, see `webapp.query.latest_per_key`
+    return df.sort(by=DATASET_ORDER, maintain_order=True)
+
+
+def encode_categories(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Convert categorical columns into enums of their sorted values, so that they
+    sort lexically and keep a fixed encoding in the Arrow IPC file.
+    """
+    columns = df.select(pl.col(pl.Categorical)).columns
+    return df.with_columns(
+        pl.col(column)
+        .cast(pl.Utf8)
+        .cast(pl.Enum(df[column].unique().cast(pl.Utf8).sort()))
+        for column in columns
+    )
+
+
+def get_dataset_path() -> Path:
+    return get_project_root() / "data" / "df.arrow"
+
 
+def get_cube_path() -> Path:
+    return get_project_root() / "data" / "cube.parquet"
 
-def add_time_filters(df: pl.DataFrame):
-    df = df.with_columns(pl.col("month").str.strptime(pl.Date, "%Y-%m"))
-    df = df.with_columns(
-        pl.col("month").dt.quarter().alias("quarter"),
-        pl.col("month").dt.year().alias("year"),
+
+def get_top_partials_path() -> Path:
+    return get_project_root() / "data" / "top.parquet"
+
+
+def replace_file(path: Path, write: Callable[[str], object]):
+    """
+    Call `write` with a temporary file name and move the file over `path`, so
+    that readers which memory-mapped the previous version keep a valid file
+    until they reload.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=path.name, delete=False
+    ) as file:
+        write(file.name)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def build_dataset():
+    """
+    Assemble the parquet partitions into an uncompressed Arrow IPC file, and
+    pre-aggregate them into the cube read by the landing page and the top
+    partials read by the Highest Resale Price page.
+    """
+    df = get_dataframe_from_parquet()
+    replace_file(get_cube_path(), build_cube(df).write_parquet)
+    replace_file(get_top_partials_path(), build_top_partials(df).write_parquet)
+    replace_file(
+        get_dataset_path(),
+        lambda name: df.write_ipc(name, compression="uncompressed"),
     )
 
-    df = df.with_columns(
-        (
-            pl.concat_str(
-                [
-                    pl.col("year").cast(str),
-                    pl.col("quarter")
-                    .cast(str)
-                    .map_elements(lambda x: f" Q{x}", return_dtype=str),
-                ]
-            ).alias("quarter_label")
+
+def ensure_dataset() -> Path:
+    """Build the dataset files if they are missing or older than the partitions."""
+    path = get_dataset_path()
+    manifest_path = get_project_root() / "data" / "manifest.json"
+
+    if (
+        not path.exists()
+        or not get_cube_path().exists()
+        or not get_top_partials_path().exists()
+        or path.stat().st_mtime < manifest_path.stat().st_mtime
+    ):
+        build_dataset()
+    return path
+
+
+@st.cache_resource(max_entries=1)
+def read_dataset(path: Path, modified_at: float) -> pl.DataFrame:
+    """Memory-map the dataset; `modified_at` reloads it after a rebuild."""
+    return pl.read_ipc(path, memory_map=True)
+
+
+@timed
+def load_dataframe() -> pl.DataFrame:
+    """
+    Return the canonical dataset. It is memory-mapped once per process and the
+    same read-only frame is shared by every session and page.
+    """
+    path = ensure_dataset()
+    return read_dataset(path, path.stat().st_mtime)
+
+
+@st.cache_resource(max_entries=1)
+def read_cube(path: Path, modified_at: float) -> pl.DataFrame:
+    return pl.read_parquet(path)
+
+
+@timed
+def load_cube() -> pl.DataFrame:
+    """Return the pre-aggregated cube, see `webapp.cube.build_cube`."""
+    ensure_dataset()
+    path = get_cube_path()
+    return read_cube(path, path.stat().st_mtime)
+
+
+@st.cache_resource(max_entries=1)
+def read_top_partials(path: Path, modified_at: float) -> pl.DataFrame:
+    return pl.read_parquet(path)
+
+
+@timed
+def load_top_partials() -> pl.DataFrame:
+    """Return the precomputed top partials, see `webapp.query.build_top_partials`."""
+    ensure_dataset()
+    path = get_top_partials_path()
+    return read_top_partials(path, path.stat().st_mtime)
+
+
+def get_download_path(download_format: str) -> Path:
+    suffix, _ = DOWNLOAD_FORMATS[download_format]
+    return get_project_root() / "data" / "downloads" / f"hdb_resale_data.{suffix}"
+
+
+@timed
+def serialize_dataframe(df: pl.DataFrame, download_format: str) -> bytes:
+    """Encode the public columns of `df` as a file in one of DOWNLOAD_FORMATS."""
+    df = df.select(column for column in download_columns if column in df.columns)
+    if download_format == "CSV":
+        return gzip.compress(df.write_csv().encode(), compresslevel=6)
+
+    buffer = io.BytesIO()
+    if download_format == "Parquet":
+        df.write_parquet(buffer, compression="zstd")
+    else:
+        df.write_ipc(buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+@timed
+def ensure_download(download_format: str) -> Path:
+    """Build the download of the dataset if it is missing or older than the dataset."""
+    dataset_path = ensure_dataset()
+    path = get_download_path(download_format)
+
+    if not path.exists() or path.stat().st_mtime < dataset_path.stat().st_mtime:
+        path.parent.mkdir(exist_ok=True)
+        data = serialize_dataframe(load_dataframe(), download_format)
+        replace_file(path, lambda name: Path(name).write_bytes(data))
+    return path
+
+
+def summarize_dataset(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Summarise the dataset per month, flat type and town, so that the domains of
+    the sidebar widgets can be computed without scanning every transaction.
+    """
+    return (
+        df.group_by(["month", "flat_type", "town"])
+        .agg(
+            pl.col("remaining_lease_years").min().alias("min_remaining_lease_years"),
+            pl.col("remaining_lease_years").max().alias("max_remaining_lease_years"),
         )
+        .sort(["month", "flat_type", "town"])
     )
-    return df
 
 
-@st.cache_data
-def load_dataframe() -> pl.DataFrame:
-    """Wrapper for get_dataframe that provides a cache"""
-    df = get_dataframe_from_parquet()
-    df = add_time_filters(df)
-    return df
+@st.cache_resource(max_entries=1)
+def read_metadata(path: Path, modified_at: float) -> pl.DataFrame:
+    return summarize_dataset(read_dataset(path, modified_at))
 
 
-schema = {
-    "_id": pl.Int64,
-    "month": pl.Utf8,
-    "town": pl.Utf8,
-    "flat_type": pl.Utf8,
-    "block": pl.Utf8,
-    "street_name": pl.Utf8,
-    "storey_range": pl.Utf8,
-    "floor_area_sqm": pl.Float32,
-    "flat_model": pl.Utf8,
-    "lease_commence_date": pl.Int16,
-    "remaining_lease": pl.Utf8,
-    "resale_price": pl.Float32,
-    "address": pl.Utf8,
-    "postal": pl.Int32,
-    "latitude": pl.Float32,
-    "longitude": pl.Float32,
-}
+@timed
+def load_metadata() -> pl.DataFrame:
+    """Return the summary of the canonical dataset, computed once per process."""
+    path = ensure_dataset()
+    return read_metadata(path, path.stat().st_mtime)
+
+
+# columns offered for download: those of the source CSV files and the ones the
+# app derived from them before it added columns for its own queries
+download_columns = [
+    *schema,
+    "remaining_lease_years",
+    "cat_remaining_lease_years",
+    "quarter",
+    "year",
+    "quarter_label",
+    "cat_resale_price",
+]
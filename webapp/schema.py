@@ -0,0 +1,70 @@
+import polars as pl
+
+from webapp.lease import get_lease_dtype
+
+# columns of the monthly CSV files. The schemas are kept apart from
+# `webapp.read` so that the ETL does not import streamlit
+schema = {
+    "_id": pl.Int64,
+    "month": pl.Utf8,
+    "town": pl.Utf8,
+    "flat_type": pl.Utf8,
+    "block": pl.Utf8,
+    "street_name": pl.Utf8,
+    "storey_range": pl.Utf8,
+    "floor_area_sqm": pl.Float32,
+    "flat_model": pl.Utf8,
+    "lease_commence_date": pl.Int16,
+    "remaining_lease": pl.Utf8,
+    "resale_price": pl.Float32,
+    "address": pl.Utf8,
+    "postal": pl.Int32,
+    "latitude": pl.Float32,
+    "longitude": pl.Float32,
+}
+
+# floats are kept at full precision so values like 60.3 round-trip to CSV exactly
+csv_schema = {
+    column: pl.Float64 if dtype == pl.Float32 else dtype
+    for column, dtype in schema.items()
+}
+
+# a fixed set of categories is shared by every partition so that they can be
+# concatenated without re-encoding, and sorts chronologically
+quarter_labels = pl.Enum(
+    [f"{year} Q{quarter}" for year in range(1990, 2100) for quarter in range(1, 5)]
+)
+
+flat_types = pl.Enum(
+    ["1 ROOM", "2 ROOM", "3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE", "MULTI-GENERATION"]
+)
+
+# compact in-memory representation of the parquet dataset: closed domains are
+# enums, open ones are dictionary encoded and numbers use the narrowest type
+dataset_schema = {
+    "_id": pl.UInt32,
+    "month": pl.Date,
+    "town": pl.Categorical,
+    "flat_type": flat_types,
+    "block": pl.Categorical,
+    "street_name": pl.Categorical,
+    "storey_range": pl.Categorical,
+    "storey_min": pl.UInt8,
+    "storey_max": pl.UInt8,
+    "floor_area_sqm": pl.Float32,
+    "flat_model": pl.Categorical,
+    "lease_commence_date": pl.Int16,
+    "remaining_lease": pl.Categorical,
+    "remaining_lease_years_exact": pl.Float32,
+    "remaining_lease_years": pl.Int16,
+    "cat_remaining_lease_years": get_lease_dtype(),
+    "resale_price": pl.UInt32,
+    "address": pl.Categorical,
+    "postal": pl.UInt32,
+    "latitude": pl.Float32,
+    "longitude": pl.Float32,
+    "map_cell": pl.UInt64,
+    "quarter": pl.Int8,
+    "year": pl.Int16,
+    "quarter_label": quarter_labels,
+}
@@ -1,47 +1,164 @@
+import hashlib
+from argparse import ArgumentParser
+from collections.abc import Iterable
 from pathlib import Path
 
 import polars as pl
 
-from webapp.read import schema
+from webapp.geo import map_cell
+from webapp.lease import bucket_lease, remaining_lease_years
+from webapp.schema import dataset_schema, quarter_labels, schema
+from webapp.update.manifest import fingerprint, load_manifest, save_manifest
 from webapp.utils import get_project_root
 
+# bump whenever `convert_month` changes what a partition holds without changing
+# its schema, so that every partition is rebuilt instead of mixing versions
+PARTITION_VERSION = 1
 
-def convert_lease(x):
-    if 0 < x <= 60:
-        result = "0-60 years"
-    elif 60 < x <= 80:
-        result = "61-80 years"
-    elif 80 < x <= 99:
-        result = "81-99 years"
-    return result
 
+def get_partition_version() -> dict:
+    """Identify the layout of the partitions written by `convert_month`."""
+    schema_repr = repr({column: str(dtype) for column, dtype in dataset_schema.items()})
+    return {
+        "version": PARTITION_VERSION,
+        "schema": hashlib.sha256(schema_repr.encode()).hexdigest(),
+    }
 
-def csv_to_parquet() -> pl.DataFrame:
-    """Combine all CSV files in the specified directory into a single parquet file"""
-    data_dir: Path = get_project_root() / "data"
 
-    df = pl.read_csv(data_dir / "*.csv", schema=schema)
+def add_time_filters(df: pl.DataFrame) -> pl.DataFrame:
+    """Materialize the date, year, quarter and quarter label used by the app."""
+    df = df.with_columns(pl.col("month").str.strptime(pl.Date, "%Y-%m"))
+    df = df.with_columns(
+        pl.col("month").dt.quarter().alias("quarter"),
+        pl.col("month").dt.year().alias("year"),
+    )
 
     df = df.with_columns(
-        (
-            pl.col("remaining_lease")
-            .str.extract(r"(\d+)", 1)
-            .cast(pl.Int64)
-            .alias("remaining_lease_years")
-        )
+        pl.format("{} Q{}", "year", "quarter")
+        .cast(quarter_labels)
+        .alias("quarter_label")
+    )
+    return df
+
+
+def add_storey_bounds(df: pl.DataFrame) -> pl.DataFrame:
+    """Split storey ranges such as "04 TO 06" into their lowest and highest floor."""
+    return df.with_columns(
+        pl.col("storey_range").str.extract(r"^(\d+)", 1).alias("storey_min"),
+        pl.col("storey_range").str.extract(r"(\d+)$", 1).alias("storey_max"),
     )
 
+
+def convert_month(csv_path: Path, parquet_path: Path) -> int:
+    """Convert a single monthly CSV file into its parquet partition."""
+    df = pl.read_csv(csv_path, schema=schema)
+
+    lease_years = remaining_lease_years()
     df = df.with_columns(
-        pl.col("remaining_lease_years")
-        .map_elements(convert_lease, pl.String)
-        .alias("cat_remaining_lease_years")
+        lease_years.alias("remaining_lease_years_exact"),
+        lease_years.floor().cast(pl.Int64).alias("remaining_lease_years"),
     )
+    df = df.with_columns(bucket_lease().alias("cat_remaining_lease_years"))
+
+    df = add_time_filters(df)
+    df = add_storey_bounds(df)
+    df = df.with_columns(map_cell().alias("map_cell"))
+    df = df.select(dataset_schema.keys()).cast(dataset_schema)
+    # ids are not unique across months, so rows keep the order of the CSV file
+    # within an id, which keeps the partition identical across conversions
+    df = df.unique(maintain_order=True)
+    df = df.sort(by="_id", maintain_order=True)
+    df.write_parquet(parquet_path)
+    return df.height
+
+
+def csv_to_parquet(
+    months: Iterable[str] | None = None,
+    full: bool = False,
+    data_dir: Path | None = None,
+) -> list[str]:
+    """
+    Convert monthly CSV files into a month-partitioned parquet dataset, and
+    return the months whose partition was rewritten or removed. The files the
+    app reads are built from the partitions by `build_app_files`.
+
+    The manifest next to the CSV files records the fingerprint of every
+    converted CSV, and a partition is only rewritten when its CSV's content
+    hash differs, so the cost of a run is proportional to the number of
+    changed months. `months` restricts the check to the given months, and
+    `full` rebuilds every partition regardless of the manifest, as does a
+    change of the partition version or schema recorded in it.
+    """
+    data_dir = data_dir or get_project_root() / "data"
+    parquet_dir = data_dir / "parquet"
+    parquet_dir.mkdir(exist_ok=True)
 
-    df = df.unique()
-    df = df.sort(by="_id")
-    df.write_parquet(data_dir / "df.parquet")
-    return
+    manifest_path = data_dir / "manifest.json"
+    manifest = load_manifest(manifest_path)
+    version = get_partition_version()
+    if manifest.get("partition") != version:
+        print("Partition version or schema changed, rebuilding every partition")
+        full = True
+    partitions = {} if full else manifest.get("partitions", {})
+
+    csv_files = {path.stem: path for path in sorted(data_dir.glob("*.csv"))}
+
+    # drop partitions whose source CSV no longer exists
+    removed = []
+    for parquet_path in parquet_dir.glob("*.parquet"):
+        if parquet_path.stem not in csv_files:
+            parquet_path.unlink()
+            partitions.pop(parquet_path.stem, None)
+            removed.append(parquet_path.stem)
+
+    if months is not None and not full:
+        csv_files = {month: csv_files[month] for month in months if month in csv_files}
+
+    converted = []
+    for month, csv_path in csv_files.items():
+        parquet_path = parquet_dir / f"{month}.parquet"
+        entry = fingerprint(csv_path)
+
+        if (
+            partitions.get(month, {}).get("sha256") == entry["sha256"]
+            and parquet_path.exists()
+        ):
+            continue
+
+        entry["rows"] = convert_month(csv_path, parquet_path)
+        partitions[month] = entry
+        converted.append(month)
+
+    if converted or removed:
+        print(f"Converted {len(converted)} month(s): {', '.join(converted)}")
+        if removed:
+            print(f"Removed {len(removed)} month(s): {', '.join(sorted(removed))}")
+        save_manifest(manifest_path, {"partition": version, "partitions": partitions})
+    else:
+        print("All parquet partitions are up to date")
+    return sorted(converted + removed)
+
+
+def build_app_files():
+    """
+    Build the dataset, cube, top partials and downloads read by the app, where
+    they are missing or older than the partitions. These files are not
+    committed, so the ETL leaves them to be built where the app runs.
+    """
+    # imported here since the app's modules import streamlit, which the ETL
+    # does not need
+    from webapp.read import DOWNLOAD_FORMATS, ensure_dataset, ensure_download
+
+    ensure_dataset()
+    for download_format in DOWNLOAD_FORMATS:
+        ensure_download(download_format)
 
 
 if __name__ == "__main__":
-    csv_to_parquet()
+    parser = ArgumentParser(description="Convert monthly CSV files to parquet.")
+    parser.add_argument("months", nargs="*", help="Months to check in YYYY-MM format")
+    parser.add_argument("--full", action="store_true", help="Rebuild all partitions")
+    args = parser.parse_args()
+
+    csv_to_parquet(months=args.months or None, full=args.full)
+    build_app_files()
@@ -0,0 +1,13 @@
+import os
+
+# the APIs read by the ETL, each of which can be pointed elsewhere through the
+# environment variable of the same name, such as at `webapp.update.mockserver`
+DEFAULT_URLS = {
+    "HDB_URL": "https://data.gov.sg/api/action/datastore_search",
+    "ONEMAP_URL": "https://www.onemap.gov.sg/api/common/elastic/search",
+    "NOMINATIM_URL": "https://nominatim.openstreetmap.org/search",
+}
+
+HDB_URL = os.environ.get("HDB_URL", DEFAULT_URLS["HDB_URL"])
+ONEMAP_URL = os.environ.get("ONEMAP_URL", DEFAULT_URLS["ONEMAP_URL"])
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", DEFAULT_URLS["NOMINATIM_URL"])
@@ -1,26 +1,32 @@
+import os
 import sys
-from pathlib import Path
 
-import polars as pl
-
-from webapp.read import get_project_root, schema
 from webapp.update.convert import csv_to_parquet
 from webapp.update.extract import extract, get_timestamps
 
 
+def report_changes(changed_months: list[str]):
+    """Expose the changed months to subsequent GitHub Actions steps."""
+    github_env = os.environ.get("GITHUB_ENV")
+    if not github_env:
+        return
+
+    with open(github_env, "a") as file:
+        file.write(f"has_changes={'true' if changed_months else 'false'}\n")
+        file.write(f"changed_months={' '.join(changed_months)}\n")
+
+
 def update_data():
     """Executes ETL process"""
-    csv_file_glob: Path = get_project_root() / "data" / "*.csv"
-    df = pl.read_csv(csv_file_glob, schema=schema)
-
     start, end = get_timestamps()
     extract([start, end, "-f"])
-    csv_to_parquet()
-    new_df = pl.read_csv(csv_file_glob, schema=schema)
-    has_changed = not df.equals(new_df)
 
-    if has_changed:
-        print("Changes detected")
+    # the manifest is only saved once the partitions are converted, so months
+    # whose conversion failed are converted and reported again by the next run
+    changed_months = csv_to_parquet()
+    if changed_months:
+        print(f"Changes detected: {', '.join(changed_months)}")
+    report_changes(changed_months)
     sys.exit(0)
 
 
@@ -1,125 +1,147 @@
+import asyncio
+import shutil
 from argparse import ArgumentParser
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
+import polars as pl
 import requests
 from dateutil.relativedelta import relativedelta
-from tqdm import tqdm
-
-
-@lru_cache
-def extract_hdb_data(year_month):
-    data = {
-        "filters": f'{{"month":"{year_month}"}}',
-        "limit": "14000",
-    }
-    search_url = "https://data.gov.sg/api/action/datastore_search?resource_id=d_8b84c4ee58e3cfc0ece0d773c8ca6abc"
-
-    response = requests.request("GET", search_url, params=data)
-    return response.json()["result"]["records"]
-
-
-def get_data(start_date="2019-01", end_date=pd.Timestamp.now().strftime("%Y-%m")):
-    dates = (
-        pd.date_range(start=start_date, end=end_date, freq="MS")
-        .strftime("%Y-%m")
-        .tolist()
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from webapp.schema import csv_schema
+from webapp.update.endpoints import HDB_URL
+from webapp.update.geocache import GeocodeCache
+from webapp.update.geocode import Geocoder, RequestsTransport, geocode_addresses
+from webapp.update.manifest import load_manifest, save_manifest
+
+HDB_RESOURCE_ID = "d_8b84c4ee58e3cfc0ece0d773c8ca6abc"
+PAGE_SIZE = 5000
+HDB_TIMEOUT = 60
+
+# columns added locally by geocoding, everything else is returned by the datastore API
+map_schema = {
+    column: csv_schema[column]
+    for column in ("address", "postal", "latitude", "longitude")
+}
+hdb_schema = {
+    column: dtype for column, dtype in csv_schema.items() if column not in map_schema
+}
+
+
+def create_session() -> requests.Session:
+    """Create a session that retries rate limited and failed requests with backoff."""
+    retry = Retry(
+        total=8,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
     )
-
-    all_items = []
-    for date in dates:
-        res = extract_hdb_data(date)
-        all_items.extend(res)
-
-    df = pd.DataFrame(all_items)
-    if df.empty:
-        return pd.DataFrame()
-
-    df["address"] = df["block"] + " " + df["street_name"]
-    return df.reset_index(drop=True)
-
-
-def fetch_osm_postal(query_address, session: requests.Session):
-    query_string = f"https://nominatim.openstreetmap.org/search?q={query_address}&format=json&addressdetails=1"
-
-    response = session.get(query_string).json()
-
-    if not response:
-        return None
-
-    return response[0]["address"].get("postcode", None)
-
-
-def fetch_map_data(query_address, session: requests.Session):
-    query_string = (
-        "https://www.onemap.gov.sg/api/common/elastic/search?&searchVal="
-        + query_address
-        + "&returnGeom=Y&getAddrDetails=Y"
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+def records_to_frame(records: list[dict]) -> pl.DataFrame:
+    """Convert a page of API records into a typed columnar batch."""
+    return pl.DataFrame(
+        {
+            column: pl.Series(column, [record[column] for record in records])
+            .cast(pl.Utf8)
+            .cast(dtype)
+            for column, dtype in hdb_schema.items()
+        }
     )
 
-    response = session.get(query_string).json()["results"][0]
-
-    if response:
-        postal_code = response["POSTAL"]
-        # use open street map if postal code is null or invalid
-        if len(str(postal_code)) < 6:
-            postal_code = fetch_osm_postal(query_address, session)
-
-    return {
-        "address": query_address,
-        "postal": postal_code,
-        "latitude": response["LATITUDE"],
-        "longitude": response["LONGITUDE"],
-    }
-
-
-def get_map_results(data):
-    unique_address = list(dict.fromkeys(data["address"]))
-    with requests.Session() as session:
-        with ThreadPoolExecutor() as executor:
-            results = list(
-                tqdm(
-                    executor.map(
-                        lambda addr: fetch_map_data(addr, session), unique_address
-                    ),
-                    total=len(unique_address),
-                )
-            )
 
-    return pd.DataFrame(results)
+def extract_hdb_data(year_month: str, session: requests.Session) -> pl.DataFrame:
+    """Fetch every record for a month, paging through the datastore API."""
+    batches = []
+    offset, total = 0, None
+
+    while total is None or offset < total:
+        params = {
+            "resource_id": HDB_RESOURCE_ID,
+            "filters": f'{{"month":"{year_month}"}}',
+            "limit": PAGE_SIZE,
+            "offset": offset,
+        }
+        response = session.get(HDB_URL, params=params, timeout=HDB_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()["result"]
+
+        total = result["total"]
+        records = result["records"]
+        if not records:
+            break
+
+        batches.append(records_to_frame(records))
+        offset += len(records)
+
+    if not batches:
+        return pl.DataFrame(schema=hdb_schema)
+    return pl.concat(batches)
+
+
+def fetch_month(
+    month: str, session: requests.Session, checkpoint_dir: Path
+) -> pl.DataFrame:
+    """Fetch a month's records, reusing the checkpoint of an interrupted run."""
+    checkpoint_path = checkpoint_dir / f"{month}.parquet"
+    if checkpoint_path.exists():
+        return pl.read_parquet(checkpoint_path)
+
+    df = extract_hdb_data(month, session)
+    df.write_parquet(checkpoint_path)
+    return df
+
+
+def get_map_results(addresses: pl.Series) -> pl.DataFrame:
+    unique_address = addresses.unique(maintain_order=True).to_list()
+
+    with GeocodeCache() as cache:
+        results = cache.get_many(unique_address)
+        missing = [address for address in unique_address if address not in results]
+        print(f"Found {len(results)} cached addresses, geocoding {len(missing)}")
+
+        if missing:
+            with requests.Session() as session:
+                geocoder = Geocoder(RequestsTransport(session))
+                fetched = asyncio.run(geocode_addresses(missing, geocoder))
+            cache.put_many(fetched)
+            results.update((result["address"], result) for result in fetched)
+
+            # keep the expired location of an address whose refresh failed
+            stale = cache.get_many(missing, include_expired=True)
+            for address, entry in stale.items():
+                if results[address]["latitude"] is None:
+                    results[address] = entry
+
+    # API results are strings and cached results are numbers, so cast both the same way
+    return pl.DataFrame(
+        {
+            column: [
+                (
+                    None
+                    if results[address][column] is None
+                    else str(results[address][column])
+                )
+                for address in unique_address
+            ]
+            for column in map_schema
+        },
+        schema={column: pl.Utf8 for column in map_schema},
+    ).cast(map_schema, strict=False)
 
 
-def load_existing_data(file_path: Path) -> pd.DataFrame:
-    """Load existing data from a CSV file if it exists, otherwise return an empty DataFrame."""
+def load_existing_data(file_path: Path) -> pl.DataFrame | None:
+    """Load existing data from a CSV file if it exists."""
     if file_path.exists():
-        df = pd.read_csv(
-            file_path,
-            dtype={
-                "_id": "Int64",
-                "month": str,
-                "town": str,
-                "flat_type": str,
-                "block": str,
-                "street_name": str,
-                "storey_range": str,
-                "floor_area_sqm": float,
-                "flat_model": str,
-                "lease_commence_date": "Int64",
-                "remaining_lease": str,
-                "resale_price": float,
-                "address": str,
-                "postal": "Int64",
-                "latitude": float,
-                "longitude": float,
-            },
-        )
-
-        return df
-
-    return pd.DataFrame()
+        return pl.read_csv(file_path, schema=csv_schema)
+    return None
 
 
 def skip_process(file_path: Path, should_process: bool) -> bool:
@@ -130,79 +152,49 @@ def skip_process(file_path: Path, should_process: bool) -> bool:
     return True
 
 
-def process_new_addresses(
-    new_data: pd.DataFrame, existing_data: pd.DataFrame
-) -> pd.DataFrame | None:
-    """Process new addresses and fetch map data for them."""
-    new_addresses = set(new_data["address"]) - set(existing_data["address"])
-    if not new_addresses:
-        return None
-
-    print(f"Processing {len(new_addresses)} new addresses")
-    addresses_to_process = new_data[new_data["address"].isin(new_addresses)]
-    map_data = get_map_results(addresses_to_process)
-    return addresses_to_process.merge(map_data, how="left", on="address")
-
-
-def process_month(month: str, data_dir: Path, should_process: bool = False):
+def process_month(month: str, data_dir: Path, records: pl.DataFrame):
     """Process and save data for a given month."""
     file_path = data_dir / f"{month}.csv"
 
-    if not skip_process(file_path, should_process):
-        return
-
-    new_data = get_data(start_date=month, end_date=month)
+    new_data = records.lazy().with_columns(
+        pl.concat_str(["block", "street_name"], separator=" ").alias("address")
+    )
     existing_data = load_existing_data(file_path)
 
-    if not existing_data.empty:
-        existing_addresses = set(existing_data["address"])
-        new_data = new_data[~new_data["address"].isin(existing_addresses)]
-
-    if not new_data.empty:
-        print(f"Fetching latitude and longitude for new addresses in {month}")
-        new_map_data = get_map_results(new_data)
-        new_data = new_data.merge(new_map_data, on="address", how="left")
+    if existing_data is not None:
+        new_data = new_data.join(
+            existing_data.lazy().select("address"), on="address", how="anti"
+        )
+    new_data = new_data.collect()
 
-    if not existing_data.empty:
-        missing_lat_lon = existing_data[["latitude", "longitude"]].isna().any(axis=1)
-        if missing_lat_lon.any():
+    frames = []
+    if existing_data is not None:
+        missing_lat_lon = existing_data.filter(
+            pl.col("latitude").is_null() | pl.col("longitude").is_null()
+        )
+        if not missing_lat_lon.is_empty():
             print(
                 f"Updating missing latitude and longitude for existing addresses in {month}"
             )
-            addresses_to_update = existing_data[missing_lat_lon]
-            updated_map_data = get_map_results(addresses_to_update)
-            existing_data.update(updated_map_data)
+            updated_map_data = get_map_results(missing_lat_lon["address"])
+            existing_data = existing_data.update(
+                updated_map_data, on="address", how="left"
+            )
 
         print(f"Processing complete for {month}")
+        frames.append(existing_data)
 
-    if not any([existing_data.empty and new_data.empty]):
-        df = pd.concat(
-            [existing_data, new_data if not new_data.empty else None], ignore_index=True
-        )
+    if not new_data.is_empty():
+        print(f"Fetching latitude and longitude for new addresses in {month}")
+        new_map_data = get_map_results(new_data["address"])
+        frames.append(new_data.join(new_map_data, on="address", how="left"))
 
-        print(f"Total number of observations for {month}: {df.shape[0]}")
-        df.sort_values(by="_id", ascending=False)
-        df = df.astype(
-            {
-                "_id": int,
-                "month": str,
-                "town": str,
-                "flat_type": str,
-                "block": str,
-                "street_name": str,
-                "storey_range": str,
-                "floor_area_sqm": float,
-                "flat_model": str,
-                "lease_commence_date": int,
-                "remaining_lease": str,
-                "resale_price": float,
-                "address": str,
-                "postal": int,
-                "latitude": float,
-                "longitude": float,
-            }
-        )
-        df.to_csv(file_path, index=False)
+    if frames:
+        df = pl.concat([frame.select(csv_schema.keys()) for frame in frames])
+        df = df.cast(csv_schema)
+
+        print(f"Total number of observations for {month}: {df.height}")
+        df.write_csv(file_path)
     return None
 
 
@@ -219,22 +211,58 @@ def extract(raw_args=None):
     parser.add_argument("start_date", type=str, help="Start date in YYYY-MM format")
     parser.add_argument("end_date", type=str, help="End date in YYYY-MM format")
     parser.add_argument("-f", "--force", action="store_true")
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from its checkpoints",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Months to fetch concurrently"
+    )
     args = parser.parse_args(raw_args)
 
     data_dir = Path("data")
     data_dir.mkdir(exist_ok=True)
 
-    start_date = pd.to_datetime(args.start_date, format="%Y-%m")
-    end_date = pd.to_datetime(args.end_date, format="%Y-%m")
+    checkpoint_dir = data_dir / ".checkpoints"
+    progress_path = checkpoint_dir / "progress.json"
+    if not args.resume:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    checkpoint_dir.mkdir(exist_ok=True)
+    progress = load_manifest(progress_path)
+
     months = (
-        pd.date_range(start=start_date, end=end_date, freq="MS")
-        .strftime("%Y-%m")
-        .tolist()
+        pl.date_range(
+            datetime.strptime(args.start_date, "%Y-%m"),
+            datetime.strptime(args.end_date, "%Y-%m"),
+            interval="1mo",
+            eager=True,
+        )
+        .dt.strftime("%Y-%m")
+        .to_list()
     )
     last_month, current_month = get_timestamps()
 
+    pending = []
     for month in months:
         should_process = args.force or month in (last_month, current_month)
-        process_month(month, data_dir, should_process)
-
+        if progress.get(month) == "done":
+            print(f"Month {month} was completed by a previous run. Skipping.")
+        elif skip_process(data_dir / f"{month}.csv", should_process):
+            pending.append(month)
+
+    # fetch months concurrently, processing them in order as they arrive
+    with create_session() as session, ThreadPoolExecutor(args.workers) as executor:
+        futures = [
+            executor.submit(fetch_month, month, session, checkpoint_dir)
+            for month in pending
+        ]
+        for month, future in zip(pending, futures):
+            process_month(month, data_dir, future.result())
+            progress[month] = "done"
+            save_manifest(progress_path, progress)
+            (checkpoint_dir / f"{month}.parquet").unlink()
+
+    shutil.rmtree(checkpoint_dir)
     return None
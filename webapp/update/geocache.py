@@ -0,0 +1,171 @@
+import sqlite3
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import polars as pl
+
+from webapp.utils import get_project_root
+
+DEFAULT_TTL_DAYS = 365
+
+
+def get_cache_path() -> Path:
+    return get_project_root() / "data" / "geocode.sqlite"
+
+
+def normalize_address(address: str) -> str:
+    return " ".join(address.upper().split())
+
+
+class GeocodeCache:
+    """
+    Persistent address -> (postal, latitude, longitude) cache backed by SQLite.
+
+    Entries older than `ttl_days` are treated as missing so that they are
+    geocoded again and refreshed.
+    """
+
+    def __init__(self, path: Path | None = None, ttl_days: float = DEFAULT_TTL_DAYS):
+        self.path = path or get_cache_path()
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode (
+                address TEXT PRIMARY KEY,
+                postal TEXT,
+                latitude REAL,
+                longitude REAL,
+                source TEXT,
+                fetched_at INTEGER
+            )
+            """
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def get_many(
+        self, addresses: list[str], include_expired: bool = False
+    ) -> dict[str, dict]:
+        """
+        Return fresh cache entries for the given addresses, keyed by address, or
+        every entry including expired ones if `include_expired` is set.
+        """
+        keys = {normalize_address(address): address for address in addresses}
+        min_fetched_at = 0 if include_expired else int(time.time() - self.ttl_seconds)
+
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (address)")
+        self.connection.execute("DELETE FROM lookup")
+        self.connection.executemany(
+            "INSERT INTO lookup VALUES (?)", ((key,) for key in keys)
+        )
+        rows = self.connection.execute(
+            """
+            SELECT geocode.address, postal, latitude, longitude
+            FROM geocode JOIN lookup USING (address)
+            WHERE fetched_at >= ?
+            """,
+            (min_fetched_at,),
+        )
+
+        return {
+            keys[key]: {
+                "address": keys[key],
+                "postal": postal,
+                "latitude": latitude,
+                "longitude": longitude,
+            }
+            for key, postal, latitude, longitude in rows
+        }
+
+    def put_many(self, results: list[dict], fetched_at: int | None = None):
+        """
+        Store geocoding results, skipping addresses that could not be resolved.
+        A result's own `fetched_at` takes precedence over the one given here.
+        """
+        fetched_at = fetched_at or int(time.time())
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    normalize_address(result["address"]),
+                    None if result["postal"] is None else str(result["postal"]),
+                    result["latitude"],
+                    result["longitude"],
+                    result.get("source"),
+                    result.get("fetched_at", fetched_at),
+                )
+                for result in results
+                if result["latitude"] is not None and result["longitude"] is not None
+            ),
+        )
+        self.connection.commit()
+
+    def stats(self) -> dict:
+        min_fetched_at = int(time.time() - self.ttl_seconds)
+        total, fresh = self.connection.execute(
+            "SELECT COUNT(*), COUNT(*) FILTER (WHERE fetched_at >= ?) FROM geocode",
+            (min_fetched_at,),
+        ).fetchone()
+        return {"entries": total, "fresh": fresh, "expired": total - fresh}
+
+
+def prewarm(cache: GeocodeCache, data_dir: Path) -> int:
+    """
+    Seed the cache with the coordinates already stored in the monthly CSV files,
+    for addresses it does not hold yet.
+
+    The coordinates of an address were geocoded when the latest month it was
+    sold in was extracted, so its entry is dated to that month. It expires a
+    TTL later like an entry cached then, and entries of different months
+    expire on different days.
+    """
+    df = (
+        pl.scan_csv(data_dir / "*.csv", infer_schema=False)
+        .select("month", "address", "postal", "latitude", "longitude")
+        .drop_nulls(["latitude", "longitude"])
+        .sort("month")
+        .unique(subset="address", keep="last")
+        .with_columns(
+            pl.col("latitude").cast(pl.Float64),
+            pl.col("longitude").cast(pl.Float64),
+            pl.lit("csv").alias("source"),
+            pl.col("month")
+            .str.strptime(pl.Date, "%Y-%m")
+            .dt.epoch("s")
+            .alias("fetched_at"),
+        )
+        .collect()
+    )
+
+    cached = cache.get_many(df["address"].to_list(), include_expired=True)
+    df = df.filter(~pl.col("address").is_in(list(cached)))
+    cache.put_many(df.to_dicts())
+    return df.height
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description="Manage the persistent geocode cache.")
+    parser.add_argument("command", choices=["prewarm", "stats"])
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS)
+    args = parser.parse_args(raw_args)
+
+    with GeocodeCache(ttl_days=args.ttl_days) as cache:
+        if args.command == "prewarm":
+            count = prewarm(cache, get_project_root() / "data")
+            print(f"Cached {count} addresses from existing CSV files")
+
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Protocol
+
+import requests
+from tqdm import tqdm
+
+from webapp.update.endpoints import NOMINATIM_URL, ONEMAP_URL
+
+
+class TransientError(Exception):
+    """Raised when a request failed in a way that is worth retrying."""
+
+
+class Transport(Protocol):
+    async def get_json(self, url: str, params: dict) -> dict | list: ...
+
+
+class RequestsTransport:
+    """Default transport that runs blocking `requests` calls in worker threads."""
+
+    def __init__(self, session: requests.Session | None = None, timeout: float = 30):
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def _get(self, url: str, params: dict):
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            raise TransientError(str(error)) from error
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientError(f"{url} returned {response.status_code}")
+
+        response.raise_for_status()
+        return response.json()
+
+    async def get_json(self, url: str, params: dict) -> dict | list:
+        return await asyncio.to_thread(self._get, url, params)
+
+    def close(self):
+        self.session.close()
+
+
+class TokenBucket:
+    """Token bucket that allows `rate` requests per second with bursts of `capacity`."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after `failure_threshold` consecutive
+    failures, and lets a single trial request through after `reset_timeout`
+    seconds. Its success closes the breaker, while its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent, claiming the trial when one is due."""
+        if self.failures < self.failure_threshold:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class HostPolicy:
+    """Concurrency, rate limit and circuit breaker settings for a single host."""
+
+    concurrency: int
+    rate: float
+    burst: int = 1
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = TokenBucket(self.rate, self.burst)
+
+
+class Geocoder:
+    """
+    Geocodes addresses against OneMap, falling back to OpenStreetMap when
+    OneMap has no valid postal code or its circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        transport: Transport | None = None,
+        onemap: HostPolicy | None = None,
+        nominatim: HostPolicy | None = None,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+    ):
+        self.transport = transport or RequestsTransport()
+        # OneMap allows 250 calls per minute, Nominatim at most 1 per second
+        self.onemap = onemap or HostPolicy(concurrency=8, rate=4, burst=8)
+        self.nominatim = nominatim or HostPolicy(concurrency=1, rate=1)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def _request(self, host: HostPolicy, url: str, params: dict):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with host.semaphore:
+                    await host.bucket.acquire()
+                    return await self.transport.get_json(url, params)
+            except TransientError:
+                if attempt == self.max_retries:
+                    raise
+
+            # exponential backoff with jitter
+            await asyncio.sleep(self.backoff * 2**attempt * (1 + random.random()))
+
+    async def _call(self, host: HostPolicy, url: str, params: dict):
+        """Make a request through the host's circuit breaker, returning None on failure."""
+        if not host.breaker.allow_request():
+            return None
+
+        try:
+            response = await self._request(host, url, params)
+        except (TransientError, requests.RequestException):
+            host.breaker.record_failure()
+            return None
+
+        host.breaker.record_success()
+        return response
+
+    async def fetch_onemap(self, query_address: str) -> dict | None:
+        params = {"searchVal": query_address, "returnGeom": "Y", "getAddrDetails": "Y"}
+        response = await self._call(self.onemap, ONEMAP_URL, params)
+
+        if not response or not response.get("results"):
+            return None
+
+        result = response["results"][0]
+        return {
+            "postal": result["POSTAL"],
+            "latitude": result["LATITUDE"],
+            "longitude": result["LONGITUDE"],
+        }
+
+    async def fetch_osm(self, query_address: str) -> dict | None:
+        params = {"q": query_address, "format": "json", "addressdetails": 1}
+        response = await self._call(self.nominatim, NOMINATIM_URL, params)
+
+        if not response:
+            return None
+
+        result = response[0]
+        return {
+            "postal": result["address"].get("postcode", None),
+            "latitude": result["lat"],
+            "longitude": result["lon"],
+        }
+
+    async def geocode(self, query_address: str) -> dict:
+        result = await self.fetch_onemap(query_address)
+        source = "onemap"
+
+        # use open street map if postal code is null or invalid
+        if result is None or len(str(result["postal"])) < 6:
+            osm_result = await self.fetch_osm(query_address)
+            if result is None:
+                result, source = osm_result, "osm"
+            elif osm_result:
+                result["postal"] = osm_result["postal"]
+                source = "onemap+osm"
+
+        if result is None:
+            result = {"postal": None, "latitude": None, "longitude": None}
+            source = None
+        return {"address": query_address, **result, "source": source}
+
+
+async def geocode_addresses(
+    addresses: list[str], geocoder: Geocoder | None = None
+) -> list[dict]:
+    """Geocode addresses concurrently, preserving their order."""
+    geocoder = geocoder or Geocoder()
+
+    with tqdm(total=len(addresses)) as progress:
+
+        async def geocode(address):
+            result = await geocoder.geocode(address)
+            progress.update()
+            return result
+
+        return await asyncio.gather(*(geocode(address) for address in addresses))
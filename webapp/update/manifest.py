@@ -0,0 +1,36 @@
+import hashlib
+import json
+from pathlib import Path
+
+
+def sha256sum(file_path: Path) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def load_manifest(file_path: Path) -> dict:
+    """Load a JSON manifest, returning an empty one if it does not exist."""
+    if not file_path.exists():
+        return {}
+
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def save_manifest(file_path: Path, manifest: dict):
+    """Write a manifest with sorted keys so diffs stay stable between runs."""
+    with open(file_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def fingerprint(file_path: Path) -> dict:
+    """
+    Fingerprint a file by size and content hash.
+
+    The modification time is left out on purpose: every file of a fresh CI
+    checkout has a new one, so it can neither show that a file is unchanged
+    nor be committed without rewriting every entry on each run.
+    """
+    return {"size": file_path.stat().st_size, "sha256": sha256sum(file_path)}
@@ -0,0 +1,268 @@
+import json
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import polars as pl
+
+from webapp.schema import schema
+from webapp.update.endpoints import DEFAULT_URLS
+from webapp.utils import get_project_root
+
+# paths of the stand-ins, matching those of the real APIs
+ENDPOINTS = {name: urlsplit(url).path for name, url in DEFAULT_URLS.items()}
+FAULTS = ("timeout", "rate_limited", "empty")
+
+# bounds of the coordinates made up for addresses that were never geocoded
+SINGAPORE = {"latitude": (1.28, 1.45), "longitude": (103.70, 103.95)}
+
+
+@dataclass
+class Faults:
+    """
+    Probability of each fault per request, and the latency added to every
+    response. A timed out request is held for `hang` seconds without a reply.
+    """
+
+    latency: float = 0
+    timeout: float = 0
+    rate_limited: float = 0
+    empty: float = 0
+    hang: float = 120
+    seed: int = 0
+
+
+class MockService:
+    """
+    Serves the datastore, OneMap and Nominatim APIs from the CSV files in
+    `data_dir`. Months without a CSV file are made up from the latest recorded
+    month, and addresses that were never geocoded get made up coordinates.
+
+    Faults are drawn from the request and the number of times it was made, so
+    a run with the same requests sees the same faults in any order.
+    """
+
+    def __init__(self, faults: Faults, data_dir: Path | None = None):
+        self.faults = faults
+        self.data_dir = data_dir or get_project_root() / "data"
+        self.attempts = {}
+        self.records = {}
+        self.locations = None
+        # reentrant, since a synthetic month reads the month it copies
+        self.lock = threading.RLock()
+
+    def draw(self, request: str) -> tuple[random.Random, str | None]:
+        """Return the random source of a request and the fault it runs into."""
+        with self.lock:
+            attempt = self.attempts.get(request, 0)
+            self.attempts[request] = attempt + 1
+
+        rng = random.Random(f"{self.faults.seed}:{request}:{attempt}")
+        draw = rng.random()
+        for fault in FAULTS:
+            probability = getattr(self.faults, fault)
+            if draw < probability:
+                return rng, fault
+            draw -= probability
+        return rng, None
+
+    def get_records(self, month: str) -> list[dict]:
+        with self.lock:
+            if month not in self.records:
+                self.records[month] = self.read_records(month)
+            return self.records[month]
+
+    def read_records(self, month: str) -> list[dict]:
+        csv_path = self.data_dir / f"{month}.csv"
+        if csv_path.exists():
+            return (
+                pl.read_csv(csv_path, infer_schema=False)
+                .drop("address", "postal", "latitude", "longitude")
+                .with_columns(pl.col("_id").cast(pl.Int64))
+                .to_dicts()
+            )
+
+        # a synthetic month copies the latest recorded one, with ids that are
+        # unique per month and above those of the recorded transactions
+        year, number = map(int, month.split("-"))
+        first_id = (year * 12 + number) * 10_000
+        latest = max(self.data_dir.glob("*.csv")).stem
+        return [
+            {**record, "_id": first_id + index, "month": month}
+            for index, record in enumerate(self.get_records(latest))
+        ]
+
+    def locate(self, address: str) -> dict:
+        """Return the recorded location of an address, or a made up one."""
+        with self.lock:
+            if self.locations is None:
+                self.locations = {
+                    row["address"]: row
+                    for row in pl.scan_csv(self.data_dir / "*.csv", schema=schema)
+                    .select("address", "postal", "latitude", "longitude")
+                    .unique("address")
+                    .collect()
+                    .iter_rows(named=True)
+                }
+
+        if address in self.locations:
+            return self.locations[address]
+
+        rng = random.Random(address)
+        return {
+            "address": address,
+            "postal": rng.randrange(100_000, 1_000_000),
+            **{column: rng.uniform(*bounds) for column, bounds in SINGAPORE.items()},
+        }
+
+    def datastore_search(self, params: dict, empty: bool) -> dict:
+        month = json.loads(params["filters"])["month"]
+        records = [] if empty else self.get_records(month)
+        offset, limit = int(params["offset"]), int(params["limit"])
+        return {
+            "success": True,
+            "result": {
+                "total": len(records),
+                "records": records[offset : offset + limit],
+            },
+        }
+
+    def onemap_search(self, params: dict, empty: bool) -> dict:
+        if empty:
+            return {"found": 0, "totalNumPages": 0, "pageNum": 1, "results": []}
+
+        location = self.locate(params["searchVal"])
+        return {
+            "found": 1,
+            "totalNumPages": 1,
+            "pageNum": 1,
+            "results": [
+                {
+                    "SEARCHVAL": location["address"],
+                    "POSTAL": str(location["postal"] or "NIL"),
+                    "LATITUDE": str(location["latitude"]),
+                    "LONGITUDE": str(location["longitude"]),
+                }
+            ],
+        }
+
+    def nominatim_search(self, params: dict, empty: bool) -> list:
+        if empty:
+            return []
+
+        location = self.locate(params["q"])
+        address = {"country": "Singapore", "country_code": "sg"}
+        if location["postal"] is not None:
+            address["postcode"] = str(location["postal"])
+        return [
+            {
+                "display_name": location["address"],
+                "lat": str(location["latitude"]),
+                "lon": str(location["longitude"]),
+                "address": address,
+            }
+        ]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        service: MockService = self.server.service
+        url = urlsplit(self.path)
+        routes = {
+            ENDPOINTS["HDB_URL"]: service.datastore_search,
+            ENDPOINTS["ONEMAP_URL"]: service.onemap_search,
+            ENDPOINTS["NOMINATIM_URL"]: service.nominatim_search,
+        }
+        if url.path not in routes:
+            self.send_error(404)
+            return
+
+        rng, fault = service.draw(self.path)
+        time.sleep(rng.uniform(0, 2 * service.faults.latency))
+
+        if fault == "timeout":
+            time.sleep(service.faults.hang)
+            self.close_connection = True
+            return
+
+        if fault == "rate_limited":
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps(
+            routes[url.path](dict(parse_qsl(url.query)), fault == "empty")
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(
+    faults: Faults, port: int = 0, data_dir: Path | None = None
+) -> ThreadingHTTPServer:
+    """Serve the stand-ins from a background thread, on a free port by default."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.service = MockService(faults, data_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_environment(server: ThreadingHTTPServer) -> dict[str, str]:
+    """Return the environment variables that point the extract at `server`."""
+    host, port = server.server_address[:2]
+    return {name: f"http://{host}:{port}{path}" for name, path in ENDPOINTS.items()}
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(
+        description="Serve local stand-ins for the datastore, OneMap and Nominatim."
+    )
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--data-dir", type=Path, help="Directory of the CSV files")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Mean seconds added to responses"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=0, help="Share of requests left unanswered"
+    )
+    parser.add_argument(
+        "--rate-limited", type=float, default=0, help="Share of requests given a 429"
+    )
+    parser.add_argument(
+        "--empty", type=float, default=0, help="Share of requests without results"
+    )
+    parser.add_argument(
+        "--hang", type=float, default=120, help="Seconds a timed out request is held"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(raw_args)
+
+    faults = Faults(
+        args.latency, args.timeout, args.rate_limited, args.empty, args.hang, args.seed
+    )
+    server = start_server(faults, args.port, args.data_dir)
+    for name, url in get_environment(server).items():
+        print(f"export {name}={url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()